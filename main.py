@@ -2,34 +2,47 @@
 
 from os import path
 import functools
+import os
 import signal
 import sys
 import time
 
+_STARTED = time.monotonic()
+
 sys.path.append(path.join(path.dirname(path.abspath(__file__)), 'lib'))
 
 from pkg.meross_adapter import MerossAdapter  # noqa
 
 _DEBUG = False
+_PROXY_CHECK_INTERVAL = 30
 _ADAPTER = None
 
 print = functools.partial(print, flush=True)
 
 
 def cleanup(signum, frame):
-    """Clean up any resources before exiting."""
-    if _ADAPTER is not None:
-        _ADAPTER.close_proxy()
+    """Wake the main thread to clean up and exit."""
+    if _ADAPTER is None:
+        sys.exit(0)
 
-    sys.exit(0)
+    _ADAPTER.shutdown_requested.set()
 
 
 if __name__ == '__main__':
     signal.signal(signal.SIGINT, cleanup)
     signal.signal(signal.SIGTERM, cleanup)
-    _ADAPTER = MerossAdapter(verbose=_DEBUG)
+    _ADAPTER = MerossAdapter(verbose=_DEBUG, started=_STARTED)
+
+    # Wake up as soon as we're signalled or the gateway unloads the adapter.
+    # The timeout only catches the gateway connection dropping silently.
+    while not _ADAPTER.shutdown_requested.wait(_PROXY_CHECK_INTERVAL):
+        if not _ADAPTER.proxy_running():
+            break
+
+    clean = _ADAPTER.shutdown()
+    _ADAPTER.close_proxy()
 
-    # Wait until the proxy stops running, indicating that the gateway shut us
-    # down.
-    while _ADAPTER.proxy_running():
-        time.sleep(2)
+    # Don't let a meross_iot call that is stuck past the deadline keep the
+    # process alive, the gateway would only kill it later.
+    if not clean:
+        os._exit(0)
@@ -0,0 +1,76 @@
+"""Meross adapter for WebThings Gateway."""
+
+import re
+
+from .meross_limiter import MerossRateLimiter
+
+
+def account_name(name):
+    """
+    Normalize an account name for use in device IDs.
+
+    name -- name of the account, as configured
+    """
+    return re.sub('[^a-z0-9]+', '-', name.lower()).strip('-')
+
+
+class MerossAccount:
+    """One Meross cloud account, with its own connection and rate budget."""
+
+    def __init__(self, name, username=None, password=None, rate=None):
+        """
+        Initialize the object.
+
+        name -- name of the account, used to prefix its device IDs, or '' for
+                the account configured through the legacy options
+        username -- Meross account username
+        password -- Meross account password
+        rate -- number of cloud requests allowed per second, on average, or
+                None for the default
+        """
+        self.name = name
+        self.username = username
+        self.password = password
+        self.manager = None
+        self.cloud_key = None
+        self.pairing = False
+        self.cancelled = False
+        self.pending_uuids = set()
+
+        if rate:
+            self.limiter = MerossRateLimiter(
+                rate=rate,
+                burst=rate * 4,
+                reserve=rate
+            )
+        else:
+            self.limiter = MerossRateLimiter()
+
+    def has_credentials(self):
+        """Determine whether the account can log in."""
+        return bool(self.username) and bool(self.password)
+
+    def device_id(self, uuid):
+        """
+        Get the base device ID of a physical device of this account.
+
+        The legacy account keeps unprefixed IDs, so that existing Things
+        survive the upgrade.
+
+        uuid -- UUID of the device
+        """
+        if not self.name:
+            return 'meross-{}'.format(uuid)
+
+        return 'meross-{}-{}'.format(self.name, uuid)
+
+    def label(self, phase):
+        """
+        Label a startup phase or job with the account name.
+
+        phase -- the unlabelled name
+        """
+        if not self.name:
+            return phase
+
+        return '{} {}'.format(self.name, phase)
@@ -1,26 +1,75 @@
 """Meross adapter for WebThings Gateway."""
 
+from concurrent.futures import wait
 from gateway_addon import Adapter, Database
-from meross_iot.manager import MerossManager
-from meross_iot.meross_event import MerossEventType
-from meross_iot.cloud.devices.light_bulbs import GenericBulb
-from meross_iot.cloud.devices.power_plugs import GenericPlug
-from meross_iot.cloud.devices.door_openers import GenericGarageDoorOpener
+import functools
+import importlib
+import os
 import threading
 import time
 
+from .meross_account import MerossAccount, account_name
+from .meross_cache import MerossCachedDevice, MerossDeviceCache, \
+    describe_device, same_device
 from .meross_device import MerossBulb, MerossOpener, MerossPlug
+from .meross_group import MerossGroup
+from .meross_metrics import MerossMetricsServer, metrics
+from .meross_pipeline import MerossCommandPipeline
+from .meross_poller import MerossPoller
+from .meross_recorder import MerossEnergyRecorder
+from .meross_scheduler import MerossScheduler
+
+
+print = functools.partial(print, flush=True)
+
+_CACHE_SAVE_INTERVAL = 300
+_PAIRING_DEBOUNCE = 5
+_PAIRING_WORKERS = 8
+_POLL_WORKERS = 4
+_URGENT_WORKERS = 16
+_DEVICE_PAIRING_TIMEOUT = 30
+_SHUTDOWN_TIMEOUT = 5
+_CONNECT_RETRY = 5
+_CONNECT_RETRY_MAX = 300
+_RECORDER_FLUSH_INTERVAL = 60
+
+# The meross_iot classes are only imported once the cloud connection starts.
+_DEVICE_KINDS = [
+    ('bulb', 'meross_iot.cloud.devices.light_bulbs', 'GenericBulb'),
+    ('plug', 'meross_iot.cloud.devices.power_plugs', 'GenericPlug'),
+    ('opener', 'meross_iot.cloud.devices.door_openers',
+     'GenericGarageDoorOpener'),
+]
+
+_DEVICE_CLASSES = {
+    'bulb': MerossBulb,
+    'plug': MerossPlug,
+    'opener': MerossOpener,
+}
+
+_POLL_INTERVAL_OPTIONS = {
+    'bulb': 'bulbPollInterval',
+    'plug': 'plugPollInterval',
+    'opener': 'openerPollInterval',
+    'electricity': 'electricityPollInterval',
+}
 
 
 class MerossAdapter(Adapter):
     """Adapter for Meross smart home devices."""
 
-    def __init__(self, verbose=False):
+    def __init__(self, verbose=False, started=None):
         """
         Initialize the object.
 
         verbose -- whether or not to enable verbose logging
+        started -- monotonic time at which the process started, if known
         """
+        start = time.monotonic()
+        self.startup_timings = []
+        if started is not None:
+            self.startup_timings.append(('import', start - started))
+
         self.name = self.__class__.__name__
         Adapter.__init__(
             self,
@@ -29,139 +78,981 @@ class MerossAdapter(Adapter):
             verbose=verbose
         )
 
-        self.manager = None
-        self.pairing = False
+        self.accounts = {}
+        self.device_kinds = []
+        self.local_network = False
+        self.stopping = False
+        self.shutdown_requested = threading.Event()
+        self.stopped = threading.Event()
+        self.stopped_cleanly = False
+        self.lock = threading.RLock()
+        self.scheduler = MerossScheduler()
+        self.scheduler.add_lane('events', 1)
+        self.probes = set()
+        self.pollers = {}
+        self.transports = {}
+        self.metrics_server = None
+        self.poll_intervals = {}
+        self.push_quiet_threshold = None
+        self.devices_by_base = {}
+        self.groups = {}
+        self.recorder = None
+        # Keyed by event type name, so that meross_iot needn't be imported.
+        self.event_handlers = {
+            'DEVICE_ONLINE_STATUS':
+                lambda d, obj: d.handle_online_status(obj.status == 'online'),
+            'DEVICE_SWITCH_STATUS':
+                lambda d, obj: d.handle_toggle(obj.switch_state),
+            'DEVICE_BULB_SWITCH_STATE':
+                lambda d, obj: d.handle_toggle(obj.is_on),
+            'DEVICE_BULB_STATE':
+                lambda d, obj: d.handle_light_state(obj.light_state),
+            'GARAGE_DOOR_STATUS':
+                lambda d, obj: d.handle_state(obj.door_state == 'open'),
+        }
+
+        groups = []
+        recorder = None
 
         database = Database(self.package_name)
         if database.open():
             config = database.load_config()
 
-            if 'username' in config and len(config['username']) > 0 and \
-                    'password' in config and len(config['password']) > 0:
-                self.manager = MerossManager.from_email_and_password(
-                    meross_email=config['username'],
-                    meross_password=config['password']
-                )
+            for kind, option in _POLL_INTERVAL_OPTIONS.items():
+                if option in config and config[option]:
+                    self.poll_intervals[kind] = config[option]
 
-                self.manager.register_event_handler(self.event_handler)
-                self.manager.start()
+            if 'pushQuietThreshold' in config and \
+                    config['pushQuietThreshold']:
+                self.push_quiet_threshold = config['pushQuietThreshold']
+
+            if 'localNetwork' in config:
+                self.local_network = bool(config['localNetwork'])
+
+            # The metrics are only diagnostics, so carry on without them if
+            # the port can't be used.
+            if 'metricsPort' in config and config['metricsPort']:
+                try:
+                    self.metrics_server = MerossMetricsServer(
+                        config['metricsPort']
+                    )
+                except OSError as e:
+                    print('Failed to export metrics on port {}: {}'.format(
+                        config['metricsPort'],
+                        e
+                    ))
+
+            if 'energyRecorder' in config and config['energyRecorder']:
+                recorder = {}
+                if 'energyRecorderDays' in config and \
+                        config['energyRecorderDays']:
+                    recorder['retention_days'] = config['energyRecorderDays']
+
+            if 'groups' in config and config['groups']:
+                groups = config['groups']
+
+            self.add_accounts(config)
 
             database.close()
 
-        self.start_pairing()
+        metrics.gauge('meross_scheduler_jobs', self.scheduler.job_count)
+        metrics.gauge('meross_scheduler_backlog', self.scheduler.backlog)
+        metrics.gauge(
+            'meross_cloud_tokens',
+            lambda: sum(
+                int(a.limiter.available()) for a in self.accounts.values()
+            )
+        )
+        metrics.gauge(
+            'meross_circuit_open',
+            lambda: sum(
+                int(a.limiter.breaker.state == 'open')
+                for a in self.accounts.values()
+            )
+        )
+        metrics.gauge(
+            'meross_pending_commands',
+            lambda: sum(
+                len(d.commands.pending) for d in self.meross_devices()
+            )
+        )
 
-    def start_pairing(self, timeout=None):
+        # Announce the devices known from the last run right away, and
+        # reconcile them with the cloud in the background.
+        self.cache = MerossDeviceCache(os.path.join(
+            self.user_profile['dataDir'],
+            self.package_name,
+            'devices.json'
+        ))
+        self.cache.load()
+
+        if recorder is not None:
+            self.recorder = MerossEnergyRecorder(
+                os.path.join(
+                    self.user_profile['dataDir'],
+                    self.package_name,
+                    'energy'
+                ),
+                **recorder
+            )
+            self.scheduler.add('meross-recorder', self.recorder.flush,
+                               _RECORDER_FLUSH_INTERVAL)
+
+        self.add_groups(groups)
+        self.restore_cached_devices()
+        self.scheduler.add('meross-cache', self.save_cache,
+                           _CACHE_SAVE_INTERVAL)
+
+        self.record_startup('register', start)
+
+        # Everything from here on, including importing meross_iot, runs in
+        # the background, so that the gateway sees the adapter right away.
+        t = threading.Thread(target=self.connect_accounts)
+        t.daemon = True
+        t.start()
+
+    def add_accounts(self, config):
         """
-        Start the pairing process.
+        Set up the Meross accounts configured in the add-on options.
 
-        timeout -- Timeout in seconds at which to quit pairing
+        The legacy username and password options make up an account whose
+        device IDs are not prefixed. It always exists, so that its cached
+        devices are restored even without credentials.
+
+        config -- the add-on options
         """
-        if self.manager is None or self.pairing:
-            return
+        rate = config.get('cloudRateLimit')
+
+        self.add_account(MerossAccount(
+            '',
+            username=config.get('username'),
+            password=config.get('password'),
+            rate=rate
+        ))
 
-        self.pairing = True
+        for options in config.get('accounts') or []:
+            name = account_name(options.get('name', ''))
 
-        for bulb in self.manager.get_devices_by_kind(GenericBulb):
-            if not bulb.online:
+            # 'group' would clash with the IDs of the group Things.
+            if not name or name == 'group' or name in self.accounts:
                 continue
 
-            n_channels = len(bulb.get_channels())
+            self.add_account(MerossAccount(
+                name,
+                username=options.get('username'),
+                password=options.get('password'),
+                rate=options.get('cloudRateLimit') or rate
+            ))
 
-            if n_channels > 1:
-                for channel in range(0, len(bulb.get_channels())):
-                    _id = 'meross-{}-{}'.format(bulb.uuid, channel)
-                    if _id not in self.devices:
-                        device = MerossBulb(self, _id, bulb, channel=channel)
-                        self.handle_device_added(device)
-            else:
-                _id = 'meross-{}'.format(bulb.uuid)
-                if _id not in self.devices:
-                    device = MerossBulb(self, _id, bulb)
-                    self.handle_device_added(device)
+    def add_account(self, account):
+        """
+        Add an account, along with the scheduler lanes its work runs on.
+
+        Each account has workers of its own, so that calls held up by a
+        throttled or unreachable account don't stall those of the others.
+
+        account -- the MerossAccount to add
+        """
+        self.accounts[account.name] = account
+        self.scheduler.add_lane(account.label('pairing'), _PAIRING_WORKERS)
+        self.scheduler.add_lane(account.label('polls'), _POLL_WORKERS)
+        self.scheduler.add_lane(account.label('urgent'), _URGENT_WORKERS)
 
-        for plug in self.manager.get_devices_by_kind(GenericPlug):
-            if not plug.online:
+    def record_startup(self, phase, start):
+        """
+        Record how long a startup phase took.
+
+        phase -- name of the phase
+        start -- monotonic time at which the phase started
+        """
+        self.startup_timings.append((phase, time.monotonic() - start))
+
+    def report_startup(self):
+        """Print how long each startup phase took."""
+        print('Startup: {}'.format(', '.join(
+            '{} {:.3f}s'.format(phase, elapsed)
+            for phase, elapsed in self.startup_timings
+        )))
+
+    def connect_accounts(self):
+        """Connect all accounts that have credentials, side by side."""
+        # Each account connects on its own, so that one being slow or down
+        # doesn't hold up the others.
+        threads = []
+        for account in list(self.accounts.values()):
+            if not account.has_credentials():
                 continue
 
-            n_channels = len(plug.get_channels())
+            t = threading.Thread(target=self.connect, args=(account,))
+            t.daemon = True
+            t.start()
+            threads.append(t)
+
+        for t in threads:
+            t.join()
+
+        self.report_startup()
+
+    def connect(self, account):
+        """
+        Log in to the Meross cloud and pair with the account's devices.
+
+        account -- the MerossAccount to connect
+        """
+        start = time.monotonic()
+        importlib.import_module('meross_iot.api')
+        importlib.import_module('meross_iot.manager')
+
+        with self.lock:
+            if len(self.device_kinds) == 0:
+                self.device_kinds = [
+                    (kind, getattr(importlib.import_module(module), name))
+                    for kind, module, name in _DEVICE_KINDS
+                ]
+
+        self.record_startup(account.label('cloud import'), start)
+
+        # The network may not be up yet at boot, and the cloud may be down,
+        # so keep trying until the adapter stops.
+        delay = _CONNECT_RETRY
+        while True:
+            try:
+                manager = self.login(account)
+                break
+            except Exception as e:
+                print('Failed to connect to the Meross cloud{}: {}; retrying '
+                      'in {} seconds'.format(
+                          ' as ' + account.name if account.name else '',
+                          e,
+                          delay
+                      ))
+
+            if self.shutdown_requested.wait(delay):
+                return
+
+            delay = min(delay * 2, _CONNECT_RETRY_MAX)
+
+        with self.lock:
+            if self.stopping:
+                manager.stop()
+                return
+
+            account.manager = manager
+
+        start = time.monotonic()
+        self.pair_account(account)
+        self.record_startup(account.label('pairing'), start)
+
+    def login(self, account):
+        """
+        Log in to the Meross cloud and start listening for events.
+
+        account -- the MerossAccount to log in with
+
+        Returns the started manager.
+        """
+        from meross_iot.manager import MerossManager
+
+        # The constructor's arguments differ between meross_iot releases, so
+        # build the manager the one way they all support.
+        start = time.monotonic()
+        manager = MerossManager.from_email_and_password(
+            meross_email=account.username,
+            meross_password=account.password
+        )
+        self.record_startup(account.label('login'), start)
+
+        # Keep hold of the account key that signs local network messages.
+        account.cloud_key = getattr(
+            getattr(manager, '_cloud_creds', None),
+            'key',
+            None
+        )
+
+        manager.register_event_handler(
+            lambda obj: self.event_handler(obj, account)
+        )
 
-            if n_channels > 1:
-                for channel in range(0, len(plug.get_channels())):
-                    _id = 'meross-{}-{}'.format(plug.uuid, channel)
-                    if _id not in self.devices:
-                        device = MerossPlug(self, _id, plug, channel=channel)
-                        self.handle_device_added(device)
+        start = time.monotonic()
+        try:
+            manager.start()
+        except:  # noqa: E722
+            # catching the exceptions from meross_iot just lead to more
+            # exceptions being thrown. cool.
+            try:
+                manager.stop()
+            except:  # noqa: E722
+                pass
+
+            raise
+
+        self.record_startup(account.label('manager'), start)
+        return manager
+
+    def start_pairing(self, timeout=None):
+        """
+        Start the pairing process, for all accounts at once.
+
+        timeout -- Timeout in seconds at which to quit pairing
+        """
+        deadline = None
+        if timeout is not None:
+            deadline = time.monotonic() + timeout
+
+        passes = []
+        try:
+            for account in list(self.accounts.values()):
+                futures = self.probe_devices(account, deadline)
+                if futures is not None:
+                    passes.append((account, futures))
+        finally:
+            for account, futures in passes:
+                self.finish_pairing(account, futures, deadline)
+
+    def pair_account(self, account, timeout=None):
+        """
+        Pair with the devices of one account.
+
+        account -- the MerossAccount to pair with
+        timeout -- Timeout in seconds at which to quit pairing, as requested
+                   by the gateway, or None to probe all devices, e.g. when
+                   connecting
+        """
+        deadline = None
+        if timeout is not None:
+            deadline = time.monotonic() + timeout
+
+        futures = self.probe_devices(account, deadline)
+        if futures is not None:
+            self.finish_pairing(account, futures, deadline)
+
+    def probe_devices(self, account, deadline):
+        """
+        Claim the pairing process of an account and probe its devices.
+
+        Devices are probed in parallel on the account's pairing lane, and each
+        one is announced as soon as it is ready.
+
+        account -- the MerossAccount to pair with
+        deadline -- monotonic time at which pairing ends, or None to probe all
+                    devices
+
+        Returns the futures of the probes, or None if pairing wasn't claimed.
+        """
+        if account.manager is None or not self.begin_pairing(account):
+            return None
+
+        futures = []
+        try:
+            for kind, clazz in self.device_kinds:
+                for meross_dev in account.manager.get_devices_by_kind(clazz):
+                    if not meross_dev.online:
+                        continue
+
+                    future = self.scheduler.submit(
+                        functools.partial(self.add_devices, account, kind,
+                                          meross_dev, deadline),
+                        lane=account.label('pairing')
+                    )
+                    futures.append(future)
+
+                    # Shutdown waits for the probes, or drops them.
+                    with self.lock:
+                        self.probes.add(future)
+
+                    future.add_done_callback(self.forget_probe)
+        except:  # noqa: E722
+            # catching the exceptions from meross_iot just lead to more
+            # exceptions being thrown. cool.
+            self.release_pairing(account, futures)
+            raise
+
+        return futures
+
+    def forget_probe(self, future):
+        """
+        Stop tracking a probe once it is done.
+
+        future -- the future of the probe
+        """
+        with self.lock:
+            self.probes.discard(future)
+
+    def finish_pairing(self, account, futures, deadline):
+        """
+        Wait for the probes of a pairing pass, as long as the pass may last.
+
+        account -- the MerossAccount being paired with
+        futures -- the futures of the probes
+        deadline -- monotonic time at which pairing ends, or None to wait for
+                    all probes
+        """
+        try:
+            if deadline is None:
+                wait(futures)
             else:
-                _id = 'meross-{}'.format(plug.uuid)
-                if _id not in self.devices:
-                    device = MerossPlug(self, _id, plug)
+                wait(futures, timeout=max(deadline - time.monotonic(), 0))
+        finally:
+            self.release_pairing(account, futures)
+
+    def release_pairing(self, account, futures):
+        """
+        Drop the probes that haven't started, and end the pass once the others
+        are done.
+
+        account -- the MerossAccount being paired with
+        futures -- the futures of the probes
+        """
+        # Don't wait for devices that are still being probed, they stop on
+        # their own once they notice that pairing is over.
+        for future in futures:
+            future.cancel()
+
+        # Hold on to the pairing claim until they did, so that the next pass
+        # doesn't add the same devices at the same time.
+        self.end_pairing_when_done(account, futures)
+
+    def end_pairing_when_done(self, account, futures):
+        """
+        Release the pairing claim of an account once all probes are done.
+
+        account -- the MerossAccount being paired with
+        futures -- the futures of the probes
+        """
+        remaining = [f for f in futures if not f.done()]
+        if len(remaining) == 0:
+            self.end_pairing(account)
+            return
+
+        count = [len(remaining)]
+        count_lock = threading.Lock()
+
+        def done(future):
+            with count_lock:
+                count[0] -= 1
+                if count[0] > 0:
+                    return
+
+            self.end_pairing(account)
+
+        for future in remaining:
+            future.add_done_callback(done)
+
+    def end_pairing(self, account):
+        """
+        Release the pairing claim of an account.
+
+        account -- the MerossAccount being paired with
+        """
+        account.pairing = False
+        self.save_cache()
+
+        # Pick up devices that came online while this pass was running.
+        with self.lock:
+            if len(account.pending_uuids) > 0 and not self.stopping:
+                self.scheduler.call_later(
+                    account.label('meross-pairing'),
+                    lambda: self.pair_pending(account),
+                    0,
+                    lane=account.label('pairing')
+                )
+
+    def begin_pairing(self, account):
+        """
+        Claim the pairing process of an account, unless it is running already.
+
+        account -- the MerossAccount to pair with
+
+        Returns whether or not pairing was claimed.
+        """
+        with self.lock:
+            if account.pairing or self.stopping:
+                return False
+
+            account.pairing = True
+            account.cancelled = False
+            return True
+
+    def request_pairing(self, account, uuid):
+        """
+        Pair with a device that just came online, batched with others.
+
+        account -- the MerossAccount the device belongs to
+        uuid -- UUID of the device
+        """
+        with self.lock:
+            account.pending_uuids.add(uuid)
+
+        self.scheduler.call_later(
+            account.label('meross-pairing'),
+            lambda: self.pair_pending(account),
+            _PAIRING_DEBOUNCE,
+            lane=account.label('pairing')
+        )
+
+    def pair_pending(self, account):
+        """
+        Pair with the devices that came online, probing only those.
+
+        account -- the MerossAccount the devices belong to
+        """
+        if account.manager is None or not self.begin_pairing(account):
+            return
+
+        with self.lock:
+            uuids = account.pending_uuids
+            account.pending_uuids = set()
+
+        try:
+            for uuid in uuids:
+                meross_dev = account.manager.get_device_by_uuid(uuid)
+                if meross_dev is None or not meross_dev.online:
+                    continue
+
+                for kind, clazz in self.device_kinds:
+                    if isinstance(meross_dev, clazz):
+                        self.add_devices(account, kind, meross_dev)
+                        break
+        finally:
+            self.end_pairing(account)
+
+    def device_ids(self, kind, meross_dev):
+        """
+        Get the device IDs and channels for a meross device object.
+
+        kind -- kind of the device, e.g. 'bulb'
+        meross_dev -- the meross device object, tagged with its account
+        """
+        base = meross_dev.account.device_id(meross_dev.uuid)
+        n_channels = len(meross_dev.get_channels())
+
+        # Openers have always been a single device, whatever their channels.
+        if n_channels > 1 and kind != 'opener':
+            return [
+                ('{}-{}'.format(base, channel), channel)
+                for channel in range(0, n_channels)
+            ]
+
+        return [(base, None)]
+
+    def add_devices(self, account, kind, meross_dev, deadline=None):
+        """
+        Add the devices for all channels of a meross device object.
+
+        Devices restored from the cache are switched over to the live object.
+
+        account -- the MerossAccount the device belongs to
+        kind -- kind of the device, e.g. 'bulb'
+        meross_dev -- the meross device object
+        deadline -- monotonic time at which pairing ends, if any
+        """
+        if deadline is not None:
+            deadline = min(deadline,
+                           time.monotonic() + _DEVICE_PAIRING_TIMEOUT)
+
+        # Only the passes requested by the gateway can be cancelled, or run
+        # out of time.
+        def expired():
+            return self.stopping or deadline is not None and \
+                (account.cancelled or time.monotonic() > deadline)
+
+        self.prepare_device(account, meross_dev)
+
+        # A device shared with another account has the same UUID there, so
+        # physical devices are keyed by their base device ID instead.
+        base = meross_dev.account.device_id(meross_dev.uuid)
+
+        description = describe_device(kind, meross_dev)
+        description['account'] = meross_dev.account.name
+        description['uuid'] = meross_dev.uuid
+
+        # The device may have changed since it was cached, e.g. with a
+        # firmware update, and then its Things are built afresh.
+        cached = self.cache.devices.get(base)
+        if cached is not None and not same_device(cached, description):
+            with self.lock:
+                stale = [
+                    d for d in self.devices_by_base.get(base, [])
+                    if getattr(d.meross_dev, 'cached', False)
+                ]
+
+            for device in stale:
+                self.handle_device_removed(device)
+
+        for _id, channel in self.device_ids(kind, meross_dev):
+            if expired():
+                return
+
+            device = self.devices.get(_id)
+
+            if device is None:
+                device = _DEVICE_CLASSES[kind](
+                    self,
+                    _id,
+                    meross_dev,
+                    channel=channel
+                )
+
+                # Shutdown may start while the device is being built, and
+                # must not see it added afterwards.
+                with self.lock:
+                    if expired():
+                        return
+
                     self.handle_device_added(device)
+            elif getattr(device.meross_dev, 'cached', False):
+                device.switch_over(meross_dev)
 
-        for opener in self.manager.get_devices_by_kind(GenericGarageDoorOpener):  # noqa: E501
-            if not opener.online:
+        with self.lock:
+            poller = self.pollers.get(base)
+            if poller is not None:
+                poller.transport = self.transports.get(base)
+
+                if poller.meross_dev is not meross_dev:
+                    poller.meross_dev = meross_dev
+                    poller.wake()
+
+        self.cache.devices[base] = description
+
+    def prepare_device(self, account, meross_dev):
+        """
+        Route and instrument the commands of a live meross device object.
+
+        account -- the MerossAccount the device belongs to
+        meross_dev -- the meross device object
+        """
+        with self.lock:
+            if getattr(meross_dev, 'prepared', False):
+                return
+
+            meross_dev.prepared = True
+            meross_dev.account = account
+
+            key = None
+            if self.local_network:
+                key = account.cloud_key
+
+            pipeline = MerossCommandPipeline(meross_dev, account.limiter, key)
+            if pipeline.transport is not None:
+                self.transports[account.device_id(meross_dev.uuid)] = \
+                    pipeline.transport
+
+    def restore_cached_devices(self):
+        """Add the devices described in the cache."""
+        for key, description in list(self.cache.devices.items()):
+            account = self.accounts.get(description.get('account', ''))
+            if account is None or description['kind'] not in _DEVICE_CLASSES:
                 continue
 
-            _id = 'meross-{}'.format(opener.uuid)
-            if _id not in self.devices:
-                device = MerossOpener(self, _id, opener)
+            # Older caches were keyed by UUID, rather than by base device ID.
+            uuid = description.setdefault('uuid', key)
+            base = account.device_id(uuid)
+            if key != base:
+                del self.cache.devices[key]
+                self.cache.devices[base] = description
+
+            meross_dev = MerossCachedDevice(uuid, description)
+            meross_dev.account = account
+
+            for _id, channel in self.device_ids(description['kind'],
+                                                meross_dev):
+                device = _DEVICE_CLASSES[description['kind']](
+                    self,
+                    _id,
+                    meross_dev,
+                    channel=channel
+                )
+
+                values = self.cache.values.get(_id, {})
+                for name, value in values.items():
+                    if name in device.properties:
+                        device.properties[name].restore(value)
+
                 self.handle_device_added(device)
 
-        self.pairing = False
+    def save_cache(self):
+        """Save the device cache, including last-known property values."""
+        # Groups are rebuilt from the options and their members, so only the
+        # Meross devices are cached, and values saved for groups by earlier
+        # versions are dropped.
+        for _id in list(self.groups.keys()):
+            self.cache.values.pop(_id, None)
+
+        for device in self.meross_devices():
+            self.cache.values[device.id] = {
+                name: prop.value for name, prop in device.properties.items()
+            }
+
+        try:
+            self.cache.save()
+        except OSError:
+            pass
 
     def cancel_pairing(self):
         """Cancel the pairing process."""
-        self.pairing = False
+        for account in list(self.accounts.values()):
+            account.cancelled = True
 
-    def event_handler(self, obj):
-        """Handle events from devices."""
-        if not hasattr(obj, 'device'):
-            return
+    def unload(self):
+        """Shut down when the gateway unloads the adapter."""
+        self.shutdown()
+        Adapter.unload(self)
 
-        _id = 'meross-{}'.format(obj.device.uuid)
+    def shutdown(self, timeout=_SHUTDOWN_TIMEOUT):
+        """
+        Stop talking to the devices and the cloud, and release all resources.
 
-        devices = []
-        if _id in self.devices:
-            devices.append(self.devices[_id])
-        elif hasattr(obj, 'channel_id'):
-            _id = '{}-{}'.format(_id, obj.channel_id)
+        Pending writes are sent first, as far as the deadline allows. If a
+        shutdown is already under way, this waits for it instead.
 
-            if _id in self.devices:
-                devices.append(self.devices[_id])
-            else:
+        timeout -- number of seconds the whole shutdown may take
+
+        Returns whether or not everything stopped within the deadline.
+        """
+        self.shutdown_requested.set()
+
+        with self.lock:
+            stopping = self.stopping
+            self.stopping = True
+            managers = []
+            for account in self.accounts.values():
+                if account.manager is not None:
+                    managers.append(account.manager)
+
+            probes = list(self.probes)
+
+        if stopping:
+            return self.stopped.wait(timeout) and self.stopped_cleanly
+
+        deadline = time.monotonic() + timeout
+
+        def remaining():
+            return max(deadline - time.monotonic(), 0)
+
+        # Probes that haven't started are dropped. The others notice that the
+        # adapter is stopping and return early, but may be in the middle of a
+        # call to the device.
+        for future in probes:
+            future.cancel()
+
+        clean = True
+        for device in self.meross_devices():
+            clean = device.commands.wait(remaining()) and clean
+
+        clean = len(wait(probes, timeout=remaining()).not_done) == 0 and clean
+
+        # Stopping a manager closes its MQTT connection and logs out, which
+        # may hang on a bad network, so don't let it hold up the rest.
+        threads = []
+        for manager in managers:
+            t = threading.Thread(target=manager.stop, name='meross-stop')
+            t.daemon = True
+            t.start()
+            threads.append(t)
+
+        for t in threads:
+            t.join(remaining())
+            clean = not t.is_alive() and clean
+
+        clean = self.scheduler.stop(remaining()) and clean
+
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+
+        self.save_cache()
+
+        if self.recorder is not None:
+            self.recorder.flush()
+
+        self.stopped_cleanly = clean
+        self.stopped.set()
+        return clean
+
+    def add_groups(self, groups):
+        """
+        Add the group Things configured in the add-on options.
+
+        Members are attached as they are added, so they may come and go.
+
+        groups -- list of group options, each with a name, a list of member
+                  device IDs or names, and optionally a type
+        """
+        for options in groups:
+            if not options.get('name') or not options.get('members'):
+                continue
+
+            group = MerossGroup(
+                self,
+                options['name'],
+                options['members'],
+                group_type=options.get('type', 'switch')
+            )
+
+            if group.id in self.groups:
+                continue
+
+            self.groups[group.id] = group
+            Adapter.handle_device_added(self, group)
+
+    def meross_devices(self):
+        """Get all devices backed by a Meross device, i.e. not the groups."""
+        return [
+            d for d in list(self.devices.values()) if d.id not in self.groups
+        ]
+
+    def handle_device_added(self, device):
+        """
+        Notify the gateway of a new device and start polling it.
+
+        device -- the device that was added
+        """
+        with self.lock:
+            Adapter.handle_device_added(self, device)
+
+            account = device.meross_dev.account
+            base = account.device_id(device.meross_dev.uuid)
+            self.devices_by_base[base] = \
+                self.devices_by_base.get(base, []) + [device]
+
+            poller = self.pollers.get(base)
+            if poller is None:
+                poller = MerossPoller(
+                    self.scheduler,
+                    account.limiter,
+                    device.meross_dev,
+                    device.poll_interval,
+                    base,
+                    lane=account.label('polls')
+                )
+
+                if self.push_quiet_threshold is not None:
+                    poller.quiet_threshold = self.push_quiet_threshold
+
+                self.pollers[base] = poller
+
+            poller.add(device)
+
+            for group in self.groups.values():
+                if group.matches(device):
+                    group.add_member(device)
+
+    def handle_device_removed(self, device):
+        """
+        Stop polling a device and notify the gateway of its removal.
+
+        device -- the device that was removed
+        """
+        with self.lock:
+            if device.id in self.groups:
+                del self.groups[device.id]
+
+                for member in list(device.members):
+                    device.remove_member(member)
+
+                Adapter.handle_device_removed(self, device)
                 return
-        else:
-            for k in self.devices.keys():
-                if k.startswith('{}-'.format(_id)):
-                    devices.append(self.devices[k])
-
-        if len(devices) == 0:
-            # If the device wasn't found, but this is an online event, try to
-            # pair with it.
-            if obj.event_type == MerossEventType.DEVICE_ONLINE_STATUS and \
+
+            for group in self.groups.values():
+                group.remove_member(device)
+
+            base = device.meross_dev.account.device_id(
+                device.meross_dev.uuid
+            )
+            channels = [
+                d for d in self.devices_by_base.get(base, [])
+                if d is not device
+            ]
+            if len(channels) > 0:
+                self.devices_by_base[base] = channels
+            else:
+                self.devices_by_base.pop(base, None)
+
+            poller = self.pollers.get(base)
+            if poller is not None:
+                poller.remove(device)
+
+                if len(poller.devices) == 0:
+                    del self.pollers[base]
+                    self.cache.forget(base)
+
+            Adapter.handle_device_removed(self, device)
+
+    def event_handler(self, obj, account):
+        """
+        Handle events from devices, on the scheduler's events lane.
+
+        obj -- the event
+        account -- the MerossAccount whose manager received the event
+        """
+        # Events arrive on the meross_iot MQTT thread. Handing them over keeps
+        # that thread free. Dispatching notifies the gateway, which blocks, so
+        # it runs on a lane of a single worker, one event at a time and in
+        # order, rather than on the event loop itself.
+        self.scheduler.submit(
+            functools.partial(self.handle_event, obj, account),
+            lane='events'
+        )
+
+    def handle_event(self, obj, account):
+        """
+        Route an event, recording how long it took.
+
+        obj -- the event
+        account -- the MerossAccount whose manager received the event
+        """
+        event_type = getattr(obj.event_type, 'name', 'unknown')
+
+        start = time.monotonic()
+        try:
+            self.dispatch_event(obj, account)
+        except Exception as e:
+            print('Failed to dispatch {} event: {!r}'.format(event_type, e))
+        finally:
+            metrics.observe('meross_event_dispatch_seconds',
+                            time.monotonic() - start,
+                            event=event_type)
+
+    def dispatch_event(self, obj, account):
+        """
+        Route an event to the devices it concerns.
+
+        obj -- the event
+        account -- the MerossAccount whose manager received the event
+        """
+        if not hasattr(obj, 'device'):
+            return
+
+        event_type = getattr(obj.event_type, 'name', None)
+        base = account.device_id(obj.device.uuid)
+        channels = self.devices_by_base.get(base)
+
+        # If the device wasn't found, or is still restored from the cache
+        # because it was offline while pairing, but this is an online event,
+        # try to pair with it.
+        if channels is None or \
+                getattr(channels[0].meross_dev, 'cached', False):
+            if event_type == 'DEVICE_ONLINE_STATUS' and \
                     obj.status == 'online':
+                self.request_pairing(account, obj.device.uuid)
 
-                def delayed_pair(self):
-                    time.sleep(5)
-                    self.start_pairing()
+            if channels is None:
+                return
 
-                t = threading.Thread(target=delayed_pair, args=(self,))
-                t.daemon = True
-                t.start()
+        poller = self.pollers.get(base)
+        if poller is not None:
+            poller.handle_push()
 
+        handler = self.event_handlers.get(event_type)
+        if handler is None:
             return
 
-        if obj.event_type == MerossEventType.DEVICE_ONLINE_STATUS:
-            for device in devices:
-                device.connected_notify(obj.status == 'online')
-        elif obj.event_type == MerossEventType.DEVICE_SWITCH_STATUS:
-            for device in devices:
-                device.handle_toggle(obj.switch_state)
-        elif obj.event_type == MerossEventType.DEVICE_BULB_SWITCH_STATE:
-            for device in devices:
-                device.handle_toggle(obj.is_on)
-        elif obj.event_type == MerossEventType.DEVICE_BULB_STATE:
-            for device in devices:
-                device.handle_light_state(obj.light_state)
-        elif obj.event_type == MerossEventType.GARAGE_DOOR_STATUS:
-            for device in devices:
-                device.handle_state(obj.door_state == 'open')
+        # Switch events carry channel_id, bulb and door events carry channel.
+        channel = getattr(obj, 'channel_id', getattr(obj, 'channel', None))
+
+        if len(channels) == 1 or channel is None:
+            devices = channels
+        else:
+            devices = [d for d in channels if d.channel == channel]
+
+        for device in devices:
+            handler(device, obj)
@@ -0,0 +1,167 @@
+"""Meross adapter for WebThings Gateway."""
+
+import json
+import os
+import threading
+
+
+_DEFAULT_LIGHT = {
+    'rgb': 0xffffff,
+    'temperature': 100,
+    'luminance': 100,
+    'capacity': 6,
+}
+
+
+def describe_device(kind, meross_dev):
+    """
+    Describe a meross device object for the cache.
+
+    kind -- kind of the device, e.g. 'bulb'
+    meross_dev -- the meross device object to describe
+    """
+    description = {
+        'kind': kind,
+        'name': meross_dev.name,
+        'type': meross_dev.type,
+        'channels': meross_dev.get_channels(),
+        'abilities': {
+            'electricity': meross_dev.supports_electricity_reading(),
+            'light': meross_dev.supports_light_control(),
+        },
+        'light': {},
+    }
+
+    if kind == 'bulb' and description['abilities']['light']:
+        description['abilities']['rgb'] = meross_dev.is_rgb()
+        description['abilities']['temperature'] = \
+            meross_dev.is_light_temperature()
+        description['abilities']['luminance'] = \
+            meross_dev.supports_luminance()
+
+        for channel in range(0, max(len(description['channels']), 1)):
+            description['light'][str(channel)] = \
+                meross_dev.get_light_color(channel=channel)
+
+    return description
+
+
+def same_device(cached, description):
+    """
+    Determine whether a device still has the Things it was cached with.
+
+    cached -- the cached description of the device
+    description -- the description of the live device
+    """
+    return all(
+        cached.get(key) == description[key]
+        for key in ('kind', 'channels', 'abilities')
+    )
+
+
+class MerossCachedDevice:
+    """Stand-in for a meross device object, restored from the cache."""
+
+    cached = True
+
+    def __init__(self, uuid, description):
+        """
+        Initialize the object.
+
+        uuid -- UUID of the device
+        description -- the cached description of the device
+        """
+        self.uuid = uuid
+        self.name = description['name']
+        self.type = description['type']
+        self.online = False
+        self._channels = description['channels']
+        self._abilities = description['abilities']
+        self._light = description['light']
+
+    def get_channels(self):
+        """Get the cached channels."""
+        return self._channels
+
+    def supports_electricity_reading(self):
+        """Get the cached electricity reading ability."""
+        return self._abilities.get('electricity', False)
+
+    def supports_light_control(self):
+        """Get the cached light control ability."""
+        return self._abilities.get('light', False)
+
+    def is_rgb(self):
+        """Get the cached RGB ability."""
+        return self._abilities.get('rgb', False)
+
+    def is_light_temperature(self):
+        """Get the cached color temperature ability."""
+        return self._abilities.get('temperature', False)
+
+    def supports_luminance(self):
+        """Get the cached luminance ability."""
+        return self._abilities.get('luminance', False)
+
+    def get_light_color(self, channel=0):
+        """
+        Get the cached light state.
+
+        channel -- the channel index
+        """
+        return self._light.get(str(channel), _DEFAULT_LIGHT)
+
+
+class MerossDeviceCache:
+    """Persistent cache of device descriptions and last-known values."""
+
+    def __init__(self, path):
+        """
+        Initialize the object.
+
+        path -- path of the cache file
+        """
+        self.path = path
+        self.devices = {}
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def load(self):
+        """Load the cache file, if there is a usable one."""
+        try:
+            with open(self.path, 'rt') as f:
+                data = json.load(f)
+
+            self.devices = data['devices']
+            self.values = data['values']
+        except (OSError, ValueError, KeyError):
+            self.devices = {}
+            self.values = {}
+
+    def save(self):
+        """Write the cache file."""
+        # Pairing, the periodic save and shutdown may all save at once, and
+        # would otherwise write the same temporary file.
+        with self.lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+            tmp = '{}.tmp'.format(self.path)
+            with open(tmp, 'wt') as f:
+                json.dump({
+                    'devices': dict(self.devices),
+                    'values': dict(self.values),
+                }, f)
+
+            os.replace(tmp, self.path)
+
+    def forget(self, base):
+        """
+        Drop a device from the cache.
+
+        base -- base device ID of the device, without the channel suffix
+        """
+        self.devices.pop(base, None)
+
+        for _id in list(self.values.keys()):
+            if _id == base or _id.startswith('{}-'.format(base)):
+                del self.values[_id]
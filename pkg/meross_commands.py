@@ -0,0 +1,99 @@
+"""Meross adapter for WebThings Gateway."""
+
+import sys
+import threading
+
+from .meross_limiter import priority
+
+
+class MerossCommandQueue:
+    """Outbound command queue of one device, drained in the background."""
+
+    def __init__(self, scheduler, send, failed=None, lane='urgent'):
+        """
+        Initialize the object.
+
+        scheduler -- the scheduler whose workers run the commands
+        send -- callable sending a batch of pending writes, as a dictionary of
+                property name to value
+        failed -- callable handling a batch that could not be sent, if any
+        lane -- name of the scheduler lane the commands run on
+        """
+        self.scheduler = scheduler
+        self.send = send
+        self.failed = failed
+        self.lane = lane
+        self.pending = {}
+        self.callbacks = {}
+        self.draining = False
+        self.lock = threading.Lock()
+        self.idle = threading.Condition(self.lock)
+
+    def put(self, name, value, done=None):
+        """
+        Queue a write, replacing any pending write to the same property.
+
+        name -- name of the property to write
+        value -- the value to write
+        done -- callable run once the batch holding the write was sent, with
+                the exception it failed with or None, if any
+        """
+        with self.lock:
+            # Re-insert, so that the batch is ordered by the latest write.
+            self.pending.pop(name, None)
+            self.pending[name] = value
+
+            if done is not None:
+                self.callbacks.setdefault(name, []).append(done)
+
+            if self.draining:
+                return
+
+            self.draining = True
+
+        # These are the user's writes, so they don't wait behind polls.
+        self.scheduler.submit(self.drain, lane=self.lane)
+
+    def drain(self):
+        """Send pending writes until the queue is empty."""
+        while True:
+            with self.lock:
+                if len(self.pending) == 0:
+                    self.draining = False
+                    self.idle.notify_all()
+                    return
+
+                batch = self.pending
+                self.pending = {}
+                callbacks = self.callbacks
+                self.callbacks = {}
+
+            error = None
+
+            try:
+                # These are the user's writes, so they go ahead of polls.
+                with priority():
+                    self.send(batch)
+            except:  # noqa: E722
+                # catching the exceptions from meross_iot just lead to more
+                # exceptions being thrown. cool.
+                error = sys.exc_info()[1]
+                if self.failed is not None:
+                    self.failed(batch)
+
+            for done in (d for ds in callbacks.values() for d in ds):
+                done(error)
+
+    def wait(self, timeout):
+        """
+        Wait until all pending writes were sent.
+
+        timeout -- maximum number of seconds to wait
+
+        Returns whether or not the queue is empty.
+        """
+        with self.idle:
+            return self.idle.wait_for(
+                lambda: not self.draining and len(self.pending) == 0,
+                timeout
+            )
@@ -1,22 +1,35 @@
 """Meross adapter for WebThings Gateway."""
 
-from gateway_addon import Device
+from gateway_addon import Device, Event
 import threading
 import time
 
+from .meross_commands import MerossCommandQueue
+from .meross_history import MerossEnergyHistory
+from .meross_light import MerossLightState, kelvin_to_temperature, \
+    temperature_to_kelvin
+from .meross_limiter import priority
+from .meross_metrics import metrics
 from .meross_property import (
     MerossBulbProperty,
     MerossOpenerProperty,
     MerossPlugProperty,
+    MerossProperty,
 )
 
 
 _POLL_INTERVAL = 5
+_QUERY_RANGE = 24 * 60 * 60
+_QUERY_INTERVAL = 60 * 60
+_TRAVEL_POLL_INTERVAL = 0.5
+_TRAVEL_TIMEOUT = 60
 
 
 class MerossDevice(Device):
     """Meross device type."""
 
+    kind = None
+
     def __init__(self, adapter, _id, meross_dev, channel=None):
         """
         Initialize the object.
@@ -40,10 +53,211 @@ class MerossDevice(Device):
         else:
             self.channel = 0
 
+        self.poll_interval = adapter.poll_intervals.get(
+            self.kind,
+            _POLL_INTERVAL
+        )
+        self.poller = None
+        self.groups = []
+        self.commands = MerossCommandQueue(
+            adapter.scheduler,
+            self.send_commands,
+            failed=self.rollback_commands,
+            lane=meross_dev.account.label('urgent')
+        )
+        self._connected = None
+
+        if adapter.local_network:
+            self.properties['transport'] = MerossProperty(
+                self,
+                'transport',
+                {
+                    'title': 'Transport',
+                    'type': 'string',
+                    'enum': [
+                        'lan',
+                        'cloud',
+                    ],
+                    'readOnly': True,
+                },
+                'cloud'
+            )
+
+            self.properties['latency'] = MerossProperty(
+                self,
+                'latency',
+                {
+                    'title': 'Latency',
+                    'type': 'number',
+                    'unit': 'millisecond',
+                    'readOnly': True,
+                },
+                0,
+                relative_deadband=0.2
+            )
+
+    def notify_property_changed(self, prop):
+        """
+        Notify the gateway of a property change.
+
+        prop -- the property that changed
+        """
+        with metrics.timer('meross_notification_seconds', kind='property'):
+            Device.notify_property_changed(self, prop)
+
+        for group in list(self.groups):
+            group.handle_member_changed(self, prop)
+
+    def connected_notify(self, connected):
+        """
+        Notify the gateway of a connectivity change.
+
+        connected -- whether or not the device is connected
+        """
+        with metrics.timer('meross_notification_seconds', kind='connected'):
+            Device.connected_notify(self, connected)
+
+    def action_notify(self, action):
+        """
+        Notify the gateway of an action status change.
+
+        action -- the action whose status changed
+        """
+        with metrics.timer('meross_notification_seconds', kind='action'):
+            Device.action_notify(self, action)
+
+    def event_notify(self, event):
+        """
+        Notify the gateway of an event.
+
+        event -- the event that occurred
+        """
+        with metrics.timer('meross_notification_seconds', kind='event'):
+            Device.event_notify(self, event)
+
+    def set_connected(self, connected):
+        """
+        Notify the gateway of a connectivity change, if there was one.
+
+        connected -- whether or not the device is now connected
+        """
+        if connected == self._connected:
+            return
+
+        self._connected = connected
+        self.connected_notify(connected)
+
+    def handle_online_status(self, online):
+        """
+        Handle an online status change pushed from the cloud.
+
+        online -- whether or not the device is now online
+        """
+        self.set_connected(online)
+
+        if online and self.poller is not None:
+            self.poller.wake()
+
+    def switch_over(self, meross_dev):
+        """
+        Switch from the stand-in restored from the cache to the live object.
+
+        meross_dev -- the live meross device object
+        """
+        self.meross_dev = meross_dev
+
+    def push_covers_status(self):
+        """Determine whether push events carry everything a poll fetches."""
+        return True
+
+    def fetch_status(self):
+        """
+        Fetch the status shared by all channels of the physical device.
+
+        This is only called on one channel device per poll, and the result is
+        passed to handle_status() of every channel device.
+        """
+        return None
+
+    def handle_status(self, status):
+        """
+        Update this channel from a polled status.
+
+        status -- the status returned by fetch_status()
+        """
+        pass
+
+    def handle_transport(self, transport):
+        """
+        Update the transport diagnostics.
+
+        transport -- the transport routing this device's commands
+        """
+        if 'transport' not in self.properties:
+            return
+
+        self.properties['transport'].update(transport.mode)
+
+        if transport.mode in transport.latency:
+            self.properties['latency'].update(
+                round(transport.latency[transport.mode], 1)
+            )
+
+    def send_commands(self, batch):
+        """
+        Send a batch of queued property writes to the device.
+
+        The properties already show the written values. They are confirmed
+        once the device reports them, through a push or a poll.
+
+        batch -- dictionary of property name to the latest value written
+        """
+        pass
+
+    def rollback_commands(self, batch):
+        """
+        Roll back the properties of a batch of writes that failed.
+
+        batch -- dictionary of property name to the latest value written
+        """
+        for name, value in batch.items():
+            if name in self.properties:
+                self.properties[name].rollback(value)
+
+    def expected_value(self, name, value):
+        """
+        Get the value the device is expected to report after a write.
+
+        name -- name of the property written
+        value -- the value written
+        """
+        return value
+
+    def handle_rollback(self, name):
+        """
+        Handle a property going back to its last reported value.
+
+        name -- name of the property
+        """
+        pass
+
+    def send_toggle(self, value):
+        """
+        Turn the device on or off.
+
+        value -- whether to turn the device on
+        """
+        if value:
+            self.meross_dev.turn_on(channel=self.channel)
+        else:
+            self.meross_dev.turn_off(channel=self.channel)
+
 
 class MerossBulb(MerossDevice):
     """Meross smart bulb type."""
 
+    kind = 'bulb'
+
     def __init__(self, adapter, _id, meross_dev, channel=None):
         """
         Initialize the object.
@@ -68,10 +282,21 @@ class MerossBulb(MerossDevice):
             False
         )
 
+        # The light state last reported by the bulb, and the one it is being
+        # set to, which unchanged values are taken from when writing.
+        self.light = None
+        self.target = None
+
         if self.meross_dev.supports_light_control():
             self._type.append('ColorControl')
 
-            color = self.meross_dev.get_light_color(channel=self.channel)
+            self.light = MerossLightState()
+            self.light.update(
+                self.meross_dev.get_light_color(channel=self.channel)
+            )
+            self.target = MerossLightState()
+            self.target.update(self.light.snapshot())
+
             if self.meross_dev.is_rgb():
                 self.properties['color'] = MerossBulbProperty(
                     self,
@@ -81,7 +306,7 @@ class MerossBulb(MerossDevice):
                         'title': 'Color',
                         'type': 'string',
                     },
-                    '#{:06x}'.format(color['rgb'])
+                    self.light.color()
                 )
 
             if self.meross_dev.is_light_temperature():
@@ -96,7 +321,7 @@ class MerossBulb(MerossDevice):
                         'minimum': 2700,
                         'maximum': 6500,
                     },
-                    color['temperature'] * (6500 - 2700) / 100 + 2700
+                    self.light.kelvin()
                 )
 
             if self.meross_dev.is_rgb() and \
@@ -114,7 +339,7 @@ class MerossBulb(MerossDevice):
                         ],
                         'readOnly': True,
                     },
-                    'temperature' if color['capacity'] == 6 else 'color'
+                    self.light.mode()
                 )
 
             if self.meross_dev.supports_luminance():
@@ -129,63 +354,173 @@ class MerossBulb(MerossDevice):
                         'minimum': 0,
                         'maximum': 100,
                     },
-                    color['luminance']
+                    self.light.luminance
                 )
 
-        t = threading.Thread(target=self.poll)
-        t.daemon = True
-        t.start()
+    def switch_over(self, meross_dev):
+        """
+        Switch from the stand-in restored from the cache to the live object.
+
+        Polls only refresh on/off, so the light state is read again, and
+        whatever was about to be written is based on it.
+
+        meross_dev -- the live meross device object
+        """
+        MerossDevice.switch_over(self, meross_dev)
+
+        if self.light is None:
+            return
+
+        self.handle_light_state(
+            self.meross_dev.get_light_color(channel=self.channel),
+            force=True
+        )
+        self.target.update(self.light.snapshot())
+
+    def handle_status(self, status):
+        """
+        Update this channel from a polled status.
+
+        status -- the status returned by fetch_status()
+        """
+        state = self.meross_dev.get_status(channel=self.channel)
+        self.properties['on'].update(state['onoff'])
+
+    def send_commands(self, batch):
+        """
+        Send a batch of queued property writes to the device.
+
+        Color, color temperature and brightness writes are merged into a
+        single set_light_color() call.
 
-    def poll(self):
-        """Poll the device for changes."""
-        while True:
-            if not self.meross_dev.online:
-                self.connected_notify(False)
-                continue
+        batch -- dictionary of property name to the latest value written
+        """
+        if 'on' in batch:
+            self.send_toggle(batch['on'])
+
+        # The batch is ordered by the latest write, so the last of color and
+        # color temperature decides which mode the bulb ends up in.
+        mode = None
+        for name in batch:
+            if name == 'color':
+                mode = 'color'
+            elif name == 'colorTemperature':
+                mode = 'temperature'
+
+        if mode is None and 'brightness' not in batch:
+            return
+
+        if mode is None and 'colorMode' in self.properties:
+            mode = self.properties['colorMode'].value
+
+        # Unchanged values are taken from the raw light state, rather than
+        # converted back from the properties.
+        luminance = batch.get('brightness', self.target.luminance)
+
+        if mode == 'color' and 'color' in self.properties:
+            rgb = self.target.rgb
+            if 'color' in batch:
+                rgb = int(batch['color'][1:], 16)
+
+            light = {'rgb': rgb, 'luminance': luminance, 'capacity': 5}
+        elif 'colorTemperature' in self.properties:
+            temperature = self.target.temperature
+            if 'colorTemperature' in batch:
+                temperature = kelvin_to_temperature(batch['colorTemperature'])
+
+            light = {
+                'temperature': temperature,
+                'luminance': luminance,
+                'capacity': 6,
+            }
+            mode = 'temperature'
+        else:
+            light = {'luminance': luminance, 'capacity': 4}
 
-            try:
-                status = self.meross_dev.get_status(channel=self.channel)
-                self.properties['on'].update(status['onoff'])
+        if 'colorMode' in self.properties and \
+                self.properties['colorMode'].value != mode:
+            self.properties['colorMode'].expect(mode)
 
-                self.connected_notify(True)
-            except:  # noqa: E722
-                # catching the exceptions from meross_iot just lead to more
-                # exceptions being thrown. cool.
-                self.connected_notify(False)
+        # Record what is being sent up front, so that a write following
+        # right after builds on it.
+        previous = self.target.snapshot()
+        self.target.update(light)
+        try:
+            self.meross_dev.set_light_color(channel=self.channel, **light)
+        except:  # noqa: E722
+            self.target.update(previous)
 
-            time.sleep(_POLL_INTERVAL)
+            if 'colorMode' in self.properties:
+                self.properties['colorMode'].rollback(mode)
+
+            raise
 
     def handle_toggle(self, value):
         """Handle a switch toggle."""
         self.properties['on'].update(value)
 
-    def handle_light_state(self, value):
-        """Handle a color change."""
-        if 'color' in self.properties:
-            self.properties['color'].update(
-                '#{:06x}'.format(value['rgb'])
-            )
+    def handle_light_state(self, value, force=False):
+        """
+        Handle a color change.
 
-        if 'colorTemperature' in self.properties:
-            self.properties['colorTemperature'].update(
-                value['temperature'] * (6500 - 2700) / 100 + 2700
-            )
+        value -- the raw light state
+        force -- whether to update all properties, rather than only those
+                 whose raw value changed
+        """
+        if self.light is None:
+            return
 
-        if 'colorMode' in self.properties:
-            if value['capacity'] == 6:
-                self.properties['colorMode'].update('temperature')
-            else:
-                self.properties['colorMode'].update('color')
+        # Only re-derive and notify the properties whose raw value changed.
+        changed = self.light.update(value)
+        self.target.update(value)
 
-        if 'brightness' in self.properties:
-            self.properties['brightness'].update(
-                value['luminance']
-            )
+        if force:
+            changed = list(self.light.snapshot())
+
+        if 'rgb' in changed and 'color' in self.properties:
+            self.properties['color'].update(self.light.color())
+
+        if 'temperature' in changed and \
+                'colorTemperature' in self.properties:
+            self.properties['colorTemperature'].update(self.light.kelvin())
+
+        if 'capacity' in changed and 'colorMode' in self.properties:
+            self.properties['colorMode'].update(self.light.mode())
+
+        if 'luminance' in changed and 'brightness' in self.properties:
+            self.properties['brightness'].update(self.light.luminance)
+
+    def expected_value(self, name, value):
+        """
+        Get the value the bulb is expected to report after a write.
+
+        name -- name of the property written
+        value -- the value written
+        """
+        if name == 'color':
+            return value.lower()
+
+        if name == 'colorTemperature':
+            # The bulb only has 101 steps of color temperature.
+            return temperature_to_kelvin(kelvin_to_temperature(value))
+
+        return value
+
+    def handle_rollback(self, name):
+        """
+        Handle a property going back to its last reported value.
+
+        name -- name of the property
+        """
+        if self.light is not None:
+            self.target.update(self.light.snapshot())
 
 
 class MerossOpener(MerossDevice):
     """Meross smart garage door opener type."""
 
+    kind = 'opener'
+
     def __init__(self, adapter, _id, meross_dev, channel=None):
         """
         Initialize the object.
@@ -214,58 +549,143 @@ class MerossOpener(MerossDevice):
         self.add_action('open', {})
         self.add_action('close', {})
 
-        t = threading.Thread(target=self.poll)
-        t.daemon = True
-        t.start()
+        # The action under way, if any, along with the door state it is
+        # waiting for and the key of its timeout.
+        self.travel = None
+        self.travel_lock = threading.Lock()
 
-    def poll(self):
-        """Poll the device for changes."""
-        while True:
-            if not self.meross_dev.online:
-                self.connected_notify(False)
-                continue
+    def push_covers_status(self):
+        """Determine whether push events carry everything a poll fetches."""
+        # While the door is moving, keep polling even if pushes arrive.
+        return self.travel is None
 
-            try:
-                state = self.meross_dev.get_status()
-                self.properties['open'].update(state)
-                self.connected_notify(True)
-            except:  # noqa: E722
-                # catching the exceptions from meross_iot just lead to more
-                # exceptions being thrown. cool.
-                self.connected_notify(False)
+    def fetch_status(self):
+        """Fetch the status shared by all channels of the physical device."""
+        # meross_iot answers from its cached state, which only pushes
+        # update, so ask the device itself while a door is moving.
+        refresh = self.poller is not None and self.poller.expedited()
+        return self.meross_dev.get_status(force_status_refresh=refresh)
 
-            time.sleep(_POLL_INTERVAL)
+    def handle_status(self, status):
+        """
+        Update this channel from a polled status.
+
+        status -- the status returned by fetch_status()
+        """
+        # the door state is reported per channel
+        if isinstance(status, dict):
+            status = status.get(self.channel, False)
+
+        self.properties['open'].update(status)
+        self.check_travel()
 
     def handle_state(self, value):
         """Handle an open/close event."""
         self.properties['open'].update(value)
+        self.check_travel()
 
     def perform_action(self, action):
         """
         Perform the requested action.
 
+        The action completes once the door is seen in the requested state.
+        Until then, the device is polled faster, so that the door's progress
+        shows without waiting for the next regular poll.
+
         action -- the action object
         """
         action.start()
 
+        if action.name not in ['open', 'close']:
+            action.status = 'error'
+            self.action_notify(action)
+            return
+
+        target = action.name == 'open'
+
+        # Don't have meross_iot wait for the sensor, as it would block
+        # without a timeout.
         try:
-            if action.name == 'open':
-                self.meross_dev.open_door()
-                action.finish()
-            elif action.name == 'close':
-                self.meross_dev.close_door()
-                action.finish()
-            else:
-                action.status = 'error'
-                self.action_notify(action)
+            with priority():
+                if target:
+                    self.meross_dev.open_door(channel=self.channel,
+                                              ensure_opened=False)
+                else:
+                    self.meross_dev.close_door(channel=self.channel,
+                                               ensure_closed=False)
         except:  # noqa: E722
+            # catching the exceptions from meross_iot just lead to more
+            # exceptions being thrown. cool.
             action.status = 'error'
             self.action_notify(action)
+            return
+
+        key = '{}-{}'.format(self.id, action.id)
+
+        with self.travel_lock:
+            previous = self.travel
+            self.travel = (action, target, key)
+
+        # A new action supersedes one still waiting for the door.
+        if previous is not None:
+            self.adapter.scheduler.remove(previous[2])
+            previous[0].status = 'error'
+            self.action_notify(previous[0])
+
+        self.adapter.scheduler.call_later(
+            key,
+            lambda: self.expire_travel(action),
+            _TRAVEL_TIMEOUT
+        )
+
+        if self.poller is not None:
+            self.poller.expedite(self.id, _TRAVEL_POLL_INTERVAL,
+                                 _TRAVEL_TIMEOUT)
+
+        # The door may be in the requested state already.
+        self.check_travel()
+
+    def check_travel(self):
+        """Complete the action under way, if the door got where it should."""
+        with self.travel_lock:
+            if self.travel is None or \
+                    self.properties['open'].value != self.travel[1]:
+                return
+
+            action, _, key = self.travel
+            self.travel = None
+
+        self.adapter.scheduler.remove(key)
+
+        if self.poller is not None:
+            self.poller.relax(self.id)
+
+        action.finish()
+
+    def expire_travel(self, action):
+        """
+        Fail an action whose door didn't get where it should in time.
+
+        action -- the action object
+        """
+        with self.travel_lock:
+            if self.travel is None or self.travel[0] is not action:
+                return
+
+            self.travel = None
+
+        if self.poller is not None:
+            self.poller.relax(self.id)
+
+        action.status = 'error'
+        self.action_notify(action)
 
 
 class MerossPlug(MerossDevice):
     """Meross smart plug type."""
 
+    kind = 'plug'
+
     def __init__(self, adapter, _id, meross_dev, channel=None):
         """
         Initialize the object.
@@ -293,6 +713,17 @@ class MerossPlug(MerossDevice):
         if self.meross_dev.supports_electricity_reading():
             self._type.append('EnergyMonitor')
 
+            self.electricity_interval = adapter.poll_intervals.get(
+                'electricity',
+                self.poll_interval
+            )
+            self.last_electricity = None
+
+            # On/off comes from meross_iot's cached state, so polling at the
+            # faster of the two rates only costs the electricity readings.
+            self.poll_interval = min(self.poll_interval,
+                                     self.electricity_interval)
+
             self.properties['power'] = MerossPlugProperty(
                 self,
                 'power',
@@ -303,7 +734,9 @@ class MerossPlug(MerossDevice):
                     'unit': 'watt',
                     'readOnly': True,
                 },
-                0
+                0,
+                deadband=1,
+                relative_deadband=0.02
             )
 
             self.properties['voltage'] = MerossPlugProperty(
@@ -316,7 +749,8 @@ class MerossPlug(MerossDevice):
                     'unit': 'volt',
                     'readOnly': True,
                 },
-                0
+                0,
+                deadband=1
             )
 
             self.properties['current'] = MerossPlugProperty(
@@ -329,38 +763,199 @@ class MerossPlug(MerossDevice):
                     'unit': 'ampere',
                     'readOnly': True,
                 },
-                0
+                0,
+                deadband=0.01,
+                relative_deadband=0.02
+            )
+
+            # Aggregates over the recent samples kept in the history, which
+            # only the channel device fetching the readings holds.
+            self.history = None
+
+            self.properties['energy'] = MerossPlugProperty(
+                self,
+                'energy',
+                {
+                    'title': 'Energy',
+                    'type': 'number',
+                    'unit': 'kilowatt hour',
+                    'multipleOf': 0.001,
+                    'readOnly': True,
+                },
+                0,
+                deadband=0.001
+            )
+
+            for name, title in [('minimumPower', 'Minimum Power'),
+                                ('maximumPower', 'Maximum Power'),
+                                ('averagePower', 'Average Power')]:
+                self.properties[name] = MerossPlugProperty(
+                    self,
+                    name,
+                    {
+                        'title': title,
+                        'type': 'number',
+                        'unit': 'watt',
+                        'readOnly': True,
+                    },
+                    0,
+                    deadband=1,
+                    relative_deadband=0.02
+                )
+
+            if adapter.recorder is not None:
+                self.add_action('queryEnergy', {
+                    'title': 'Query Energy History',
+                    'description': 'Report the recorded samples, averaged '
+                                   'over fixed intervals',
+                    'input': {
+                        'type': 'object',
+                        'properties': {
+                            'start': {
+                                'type': 'number',
+                                'description': 'Start of the range, in '
+                                               'seconds since the epoch',
+                            },
+                            'end': {
+                                'type': 'number',
+                                'description': 'End of the range, in '
+                                               'seconds since the epoch',
+                            },
+                            'interval': {
+                                'type': 'integer',
+                                'minimum': 1,
+                                'unit': 'second',
+                            },
+                        },
+                    },
+                })
+
+                self.add_event('energyHistory', {
+                    'title': 'Energy History',
+                    'description': 'Result of an energy history query',
+                    'type': 'object',
+                })
+
+    def push_covers_status(self):
+        """Determine whether push events carry everything a poll fetches."""
+        # Electricity readings are never pushed.
+        return 'power' not in self.properties
+
+    def fetch_status(self):
+        """Fetch the status shared by all channels of the physical device."""
+        if 'power' not in self.properties:
+            return None
+
+        # Polls are jittered, so read on the poll nearest to the interval
+        # rather than the first one past it.
+        now = time.monotonic()
+        if self.last_electricity is not None and \
+                now - self.last_electricity < \
+                self.electricity_interval - self.poll_interval / 2:
+            return None
+
+        self.last_electricity = now
+        return self.handle_electricity(self.meross_dev.get_electricity())
+
+    def handle_electricity(self, reading):
+        """
+        Add an electricity reading to the history of the physical device.
+
+        The readings are those of the whole strip, so they are kept and
+        recorded once, by the channel device that fetched them, rather than
+        by every channel.
+
+        reading -- the reading returned by meross_iot
+
+        Returns the property values shared by all channels.
+        """
+        power = reading['power'] / 1000.0
+        voltage = reading['voltage'] / 10.0
+        current = reading['current'] / 1000.0
+
+        if self.history is None:
+            # Carry on from the energy total restored from the cache.
+            self.history = MerossEnergyHistory(
+                energy=self.properties['energy'].value,
+                interval=self.electricity_interval
             )
 
-        t = threading.Thread(target=self.poll)
-        t.daemon = True
-        t.start()
+        now = time.time()
+        self.history.add(now, power)
+
+        if self.adapter.recorder is not None:
+            self.adapter.recorder.record(self.recorder_id(), now, power,
+                                         voltage, current)
 
-    def poll(self):
-        """Poll the device for changes."""
-        while True:
-            if not self.meross_dev.online:
-                self.connected_notify(False)
-                continue
+        return {
+            'power': power,
+            'voltage': voltage,
+            'current': current,
+            'energy': round(self.history.energy, 3),
+            'minimumPower': self.history.minimum(),
+            'maximumPower': self.history.maximum(),
+            'averagePower': round(self.history.mean(), 1),
+        }
 
-            try:
-                on = self.meross_dev.get_status(channel=self.channel)
-                self.properties['on'].update(on)
+    def handle_status(self, status):
+        """
+        Update this channel from a polled status.
 
-                if self.meross_dev.supports_electricity_reading():
-                    e = self.meross_dev.get_electricity()
-                    self.properties['power'].update(e['power'] / 1000.0)
-                    self.properties['voltage'].update(e['voltage'] / 10.0)
-                    self.properties['current'].update(e['current'] / 1000.0)
+        status -- the status returned by fetch_status()
+        """
+        on = self.meross_dev.get_status(channel=self.channel)
+        self.properties['on'].update(on)
 
-                self.connected_notify(True)
-            except:  # noqa: E722
-                # catching the exceptions from meross_iot just lead to more
-                # exceptions being thrown. cool.
-                self.connected_notify(False)
+        if status is None:
+            return
 
-            time.sleep(_POLL_INTERVAL)
+        for name, value in status.items():
+            self.properties[name].update(value)
+
+    def send_commands(self, batch):
+        """
+        Send a batch of queued property writes to the device.
+
+        batch -- dictionary of property name to the latest value written
+        """
+        if 'on' in batch:
+            self.send_toggle(batch['on'])
 
     def handle_toggle(self, value):
         """Handle a switch toggle."""
         self.properties['on'].update(value)
+
+    def recorder_id(self):
+        """Get the ID the samples of the physical device are recorded under."""
+        return self.meross_dev.account.device_id(self.meross_dev.uuid)
+
+    def perform_action(self, action):
+        """
+        Perform the requested action.
+
+        action -- the action object
+        """
+        action.start()
+
+        if action.name != 'queryEnergy' or self.adapter.recorder is None:
+            action.status = 'error'
+            self.action_notify(action)
+            return
+
+        _input = action.input or {}
+        end = _input.get('end') or time.time()
+        start = _input.get('start') or end - _QUERY_RANGE
+        interval = _input.get('interval') or _QUERY_INTERVAL
+
+        try:
+            result = self.adapter.recorder.query(self.recorder_id(), start,
+                                                 end, interval)
+        except (OSError, ValueError):
+            action.status = 'error'
+            self.action_notify(action)
+            return
+
+        result['start'] = start
+        result['end'] = end
+        self.event_notify(Event(self, 'energyHistory', result))
+        action.finish()
@@ -0,0 +1,263 @@
+"""Meross adapter for WebThings Gateway."""
+
+from gateway_addon import Device, Event
+import re
+import threading
+
+from .meross_metrics import metrics
+from .meross_property import MerossProperty
+
+
+_GROUP_PROPERTIES = {
+    'on': {
+        '@type': 'OnOffProperty',
+        'title': 'On/Off',
+        'type': 'boolean',
+    },
+    'brightness': {
+        '@type': 'BrightnessProperty',
+        'title': 'Brightness',
+        'type': 'integer',
+        'unit': 'percent',
+        'minimum': 0,
+        'maximum': 100,
+    },
+    'color': {
+        '@type': 'ColorProperty',
+        'title': 'Color',
+        'type': 'string',
+    },
+    'colorTemperature': {
+        '@type': 'ColorTemperatureProperty',
+        'title': 'Color Temperature',
+        'type': 'integer',
+        'unit': 'kelvin',
+        'minimum': 2700,
+        'maximum': 6500,
+    },
+}
+
+_GROUP_TYPES = {
+    'switch': (['OnOffSwitch'], ['on']),
+    'light': (
+        ['OnOffSwitch', 'Light', 'ColorControl'],
+        ['on', 'brightness', 'color', 'colorTemperature'],
+    ),
+}
+
+_GROUP_DEFAULTS = {
+    'on': False,
+    'brightness': 100,
+    'color': '#ffffff',
+    'colorTemperature': 2700,
+}
+
+
+def group_id(name):
+    """
+    Build the device ID of a group.
+
+    name -- name of the group
+    """
+    return 'meross-group-{}'.format(
+        re.sub('[^a-z0-9]+', '-', name.lower()).strip('-')
+    )
+
+
+class MerossGroupProperty(MerossProperty):
+    """Property of a group, fanning writes out to the members."""
+
+    def set_value(self, value):
+        """
+        Set the value on all members that have this property.
+
+        value -- the value to set
+        """
+        self.device.fan_out(self.name, value)
+
+
+class MerossGroup(Device):
+    """Virtual Thing controlling several devices at once."""
+
+    def __init__(self, adapter, name, members, group_type='switch'):
+        """
+        Initialize the object.
+
+        adapter -- the Adapter managing this group
+        name -- name of the group
+        members -- IDs or names of the member devices
+        group_type -- 'switch' for on/off only, or 'light' to also control
+                      brightness and color
+        """
+        Device.__init__(self, adapter, group_id(name))
+
+        self.name = name
+        self.description = 'Group of Meross devices'
+        self.member_keys = set(members)
+        self.members = []
+        self.lock = threading.Lock()
+
+        types, names = _GROUP_TYPES.get(group_type, _GROUP_TYPES['switch'])
+        self._type = list(types)
+
+        for prop in names:
+            self.properties[prop] = MerossGroupProperty(
+                self,
+                prop,
+                dict(_GROUP_PROPERTIES[prop]),
+                _GROUP_DEFAULTS[prop]
+            )
+
+        self.add_event('memberFailed', {
+            'title': 'Member Failed',
+            'description': 'A member device did not accept a change',
+            'type': 'object',
+        })
+
+    def notify_property_changed(self, prop):
+        """
+        Notify the gateway of a property change.
+
+        prop -- the property that changed
+        """
+        with metrics.timer('meross_notification_seconds', kind='property'):
+            Device.notify_property_changed(self, prop)
+
+    def event_notify(self, event):
+        """
+        Notify the gateway of an event.
+
+        event -- the event that occurred
+        """
+        with metrics.timer('meross_notification_seconds', kind='event'):
+            Device.event_notify(self, event)
+
+    def matches(self, device):
+        """
+        Determine whether a device is a member of this group.
+
+        device -- the device to check
+        """
+        return device.id in self.member_keys or \
+            device.name in self.member_keys
+
+    def add_member(self, device):
+        """
+        Add a member device.
+
+        device -- the device to add
+        """
+        with self.lock:
+            if device in self.members:
+                return
+
+            self.members.append(device)
+
+        device.groups.append(self)
+
+        for name in self.properties:
+            self.derive(name)
+
+    def remove_member(self, device):
+        """
+        Remove a member device.
+
+        device -- the device to remove
+        """
+        with self.lock:
+            if device not in self.members:
+                return
+
+            self.members.remove(device)
+
+        if self in device.groups:
+            device.groups.remove(self)
+
+        for name in self.properties:
+            self.derive(name)
+
+    def handle_member_changed(self, device, prop):
+        """
+        Update the group state after a member property changed.
+
+        device -- the member device
+        prop -- the member property that changed
+        """
+        if prop.name in self.properties:
+            self.derive(prop.name, latest=prop.value)
+
+    def derive(self, name, latest=None, force=False):
+        """
+        Derive the value of a group property from the members.
+
+        On is on if any member is on, brightness is the members' average, and
+        colors follow the member that changed last.
+
+        name -- name of the property
+        latest -- value of the member property that changed last, if any
+        force -- whether to notify even if the value did not change
+        """
+        with self.lock:
+            values = [
+                m.properties[name].value for m in self.members
+                if name in m.properties
+            ]
+
+        if len(values) == 0:
+            return
+
+        if name == 'on':
+            value = any(values)
+        elif name == 'brightness':
+            value = round(sum(values) / len(values))
+        elif latest is not None:
+            value = latest
+        else:
+            value = values[0]
+
+        self.properties[name].update(value, force=force)
+
+    def fan_out(self, name, value):
+        """
+        Queue a write of a value on all members.
+
+        Each member shows the value right away, and sends it through its own
+        command queue, like a write to the member itself. Members that fail
+        are reported through the memberFailed event. Once all members are
+        done, the derived group value is notified.
+
+        name -- name of the property to write
+        value -- the value to write
+        """
+        with self.lock:
+            members = [m for m in self.members if name in m.properties]
+
+        if len(members) == 0:
+            self.properties[name].update(value, force=True)
+            return
+
+        remaining = [len(members)]
+        remaining_lock = threading.Lock()
+
+        def done(member, error):
+            if error is not None:
+                self.event_notify(Event(self, 'memberFailed', {
+                    'member': member.id,
+                    'property': name,
+                    'error': str(error),
+                }))
+
+            with remaining_lock:
+                remaining[0] -= 1
+                if remaining[0] > 0:
+                    return
+
+            self.derive(name, latest=value, force=True)
+
+        for member in members:
+            member.properties[name].expect(value)
+            member.commands.put(
+                name,
+                value,
+                done=lambda error, member=member: done(member, error)
+            )
@@ -0,0 +1,79 @@
+"""Meross adapter for WebThings Gateway."""
+
+from array import array
+
+
+_HISTORY_SIZE = 720
+_GAP_INTERVALS = 2
+_MIN_GAP = 600
+
+
+class MerossEnergyHistory:
+    """Fixed-size ring buffer of the power samples of one plug."""
+
+    def __init__(self, size=_HISTORY_SIZE, energy=0.0, interval=0):
+        """
+        Initialize the object.
+
+        size -- maximum number of samples kept
+        energy -- energy total to start from, in kWh
+        interval -- number of seconds between samples
+        """
+        self.size = size
+        # Allow for a missed sample before treating the device as gone, and
+        # for polls held back while the cloud is throttled.
+        self.max_gap = max(interval * _GAP_INTERVALS, _MIN_GAP)
+        self.timestamps = array('d', bytes(8 * size))
+        self.power = array('d', bytes(8 * size))
+        self.index = 0
+        self.count = 0
+        self.power_sum = 0.0
+        self.energy = energy
+
+    def add(self, timestamp, power):
+        """
+        Add a sample, evicting the oldest one if the buffer is full.
+
+        timestamp -- time of the sample, in seconds since the epoch
+        power -- power, in watts
+        """
+        if self.count > 0:
+            last = (self.index - 1) % self.size
+            elapsed = timestamp - self.timestamps[last]
+
+            # Integrate with the trapezoidal rule, but don't guess across
+            # gaps, e.g. while the device was offline.
+            if 0 < elapsed <= self.max_gap:
+                self.energy += \
+                    (self.power[last] + power) / 2 * elapsed / 3600 / 1000
+
+        if self.count == self.size:
+            self.power_sum -= self.power[self.index]
+        else:
+            self.count += 1
+
+        self.timestamps[self.index] = timestamp
+        self.power[self.index] = power
+        self.power_sum += power
+        self.index = (self.index + 1) % self.size
+
+    def minimum(self):
+        """Get the minimum power in the buffer."""
+        if self.count == 0:
+            return 0.0
+
+        return min(self.power[:self.count])
+
+    def maximum(self):
+        """Get the maximum power in the buffer."""
+        if self.count == 0:
+            return 0.0
+
+        return max(self.power[:self.count])
+
+    def mean(self):
+        """Get the mean power in the buffer."""
+        if self.count == 0:
+            return 0.0
+
+        return self.power_sum / self.count
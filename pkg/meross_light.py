@@ -0,0 +1,102 @@
+"""Meross adapter for WebThings Gateway."""
+
+
+_KELVIN_MIN = 2700
+_KELVIN_MAX = 6500
+
+# Meross expresses color temperature from 0 to 100, mapped linearly onto the
+# bulbs' kelvin range. Both directions are precomputed.
+_TEMPERATURE_TO_KELVIN = tuple(
+    _KELVIN_MIN + t * (_KELVIN_MAX - _KELVIN_MIN) // 100 for t in range(101)
+)
+_KELVIN_TO_TEMPERATURE = bytes(
+    int((k - _KELVIN_MIN) / (_KELVIN_MAX - _KELVIN_MIN) * 100)
+    for k in range(_KELVIN_MIN, _KELVIN_MAX + 1)
+)
+_HEX = tuple('{:02x}'.format(i) for i in range(256))
+
+_FIELDS = ('rgb', 'temperature', 'luminance', 'capacity')
+
+
+def kelvin_to_temperature(kelvin):
+    """
+    Convert a color temperature to the Meross scale.
+
+    kelvin -- the color temperature, in kelvin
+    """
+    kelvin = min(max(int(kelvin), _KELVIN_MIN), _KELVIN_MAX)
+    return _KELVIN_TO_TEMPERATURE[kelvin - _KELVIN_MIN]
+
+
+def temperature_to_kelvin(temperature):
+    """
+    Convert a color temperature from the Meross scale.
+
+    temperature -- the color temperature, from 0 to 100
+    """
+    return _TEMPERATURE_TO_KELVIN[min(max(temperature, 0), 100)]
+
+
+def rgb_to_hex(rgb):
+    """
+    Convert a Meross color to a hex color string.
+
+    rgb -- the color, as an integer
+    """
+    return '#' + _HEX[(rgb >> 16) & 0xff] + _HEX[(rgb >> 8) & 0xff] + \
+        _HEX[rgb & 0xff]
+
+
+class MerossLightState:
+    """Raw light state of one bulb channel, as reported by the bulb."""
+
+    __slots__ = _FIELDS
+
+    def __init__(self, rgb=0xffffff, temperature=100, luminance=100,
+                 capacity=6):
+        """
+        Initialize the object.
+
+        rgb -- color, as an integer
+        temperature -- color temperature, from 0 to 100
+        luminance -- brightness, from 0 to 100
+        capacity -- bit mask of the current light mode
+        """
+        self.rgb = rgb
+        self.temperature = temperature
+        self.luminance = luminance
+        self.capacity = capacity
+
+    def update(self, light):
+        """
+        Update the state in place.
+
+        light -- dictionary of raw values, as reported by the bulb; missing
+                 values are left as they are
+
+        Returns the names of the values that changed.
+        """
+        changed = []
+        for name in _FIELDS:
+            value = light.get(name)
+            if value is not None and value != getattr(self, name):
+                setattr(self, name, value)
+                changed.append(name)
+
+        return changed
+
+    def snapshot(self):
+        """Get the raw values, as a dictionary."""
+        return {name: getattr(self, name) for name in _FIELDS}
+
+    def color(self):
+        """Get the color as a hex string."""
+        return rgb_to_hex(self.rgb)
+
+    def kelvin(self):
+        """Get the color temperature in kelvin."""
+        return temperature_to_kelvin(self.temperature)
+
+    def mode(self):
+        """Get the color mode, 'color' or 'temperature'."""
+        return 'temperature' if self.capacity == 6 else 'color'
@@ -0,0 +1,258 @@
+"""Meross adapter for WebThings Gateway."""
+
+from contextlib import contextmanager
+import threading
+import time
+
+from .meross_metrics import metrics
+
+
+_RATE = 10
+_BURST = 40
+_RESERVE = 10
+_ACQUIRE_TIMEOUT = 10
+_FAILURE_THRESHOLD = 10
+_RESET_TIMEOUT = 30
+_RESET_TIMEOUT_MAX = 300
+_PROBE_WAIT = 1
+
+# Whether the current thread makes calls on behalf of the user. This applies
+# to every limiter, whichever account a call goes to.
+_local = threading.local()
+
+
+@contextmanager
+def priority():
+    """Mark the calls made by the current thread as user-initiated."""
+    urgent = is_urgent()
+    _local.urgent = True
+    try:
+        yield
+    finally:
+        _local.urgent = urgent
+
+
+def is_urgent():
+    """Determine whether the current thread makes user-initiated calls."""
+    return getattr(_local, 'urgent', False)
+
+
+class MerossCloudUnavailable(Exception):
+    """The cloud can't be called right now, without it having failed."""
+
+    pass
+
+
+class MerossCircuitBreaker:
+    """Stops calling the cloud after repeated failures, until it recovers."""
+
+    def __init__(self, threshold=_FAILURE_THRESHOLD,
+                 reset_timeout=_RESET_TIMEOUT):
+        """
+        Initialize the object.
+
+        threshold -- number of consecutive failures that open the circuit
+        reset_timeout -- number of seconds the circuit stays open at first
+        """
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.timeout = reset_timeout
+
+        # closed: calls go through
+        # open: calls are refused until the timeout has passed
+        # half-open: a single probe goes through, closing the circuit if it
+        #            succeeds and opening it for longer if it fails
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    def allow(self, urgent=False):
+        """
+        Determine whether a call may go through.
+
+        urgent -- whether the call was initiated by the user; these always go
+                  through, and double as probes while the circuit is open
+
+        Returns whether or not the call may go through.
+        """
+        with self.lock:
+            if self.state == 'closed' or urgent:
+                return True
+
+            if self.state == 'open' and \
+                    time.monotonic() >= self.opened_at + self.timeout:
+                self.state = 'half-open'
+
+            if self.state == 'half-open' and not self.probing:
+                self.probing = True
+                return True
+
+            return False
+
+    def release(self):
+        """Give up a probe that was allowed but never sent."""
+        with self.lock:
+            self.probing = False
+
+    def retry_after(self):
+        """Get the number of seconds until a call may go through."""
+        with self.lock:
+            if self.state == 'closed':
+                return 0
+
+            if self.state == 'half-open':
+                return _PROBE_WAIT if self.probing else 0
+
+            return max(self.opened_at + self.timeout - time.monotonic(), 0)
+
+    def record_success(self):
+        """Record a successful call, closing the circuit."""
+        with self.lock:
+            self.state = 'closed'
+            self.failures = 0
+            self.timeout = self.reset_timeout
+            self.probing = False
+
+    def record_failure(self):
+        """Record a failed call, opening the circuit if there were too many."""
+        with self.lock:
+            self.failures += 1
+
+            if self.state == 'half-open':
+                self.timeout = min(self.timeout * 2, _RESET_TIMEOUT_MAX)
+            elif self.failures < self.threshold:
+                return
+
+            self.state = 'open'
+            self.opened_at = time.monotonic()
+            self.probing = False
+
+
+class MerossRateLimiter:
+    """Token bucket shared by all outbound cloud calls."""
+
+    def __init__(self, rate=_RATE, burst=_BURST, reserve=_RESERVE):
+        """
+        Initialize the object.
+
+        rate -- number of calls allowed per second, on average
+        burst -- maximum number of calls allowed at once
+        reserve -- number of tokens only user-initiated calls may take
+        """
+        self.rate = rate
+        self.burst = burst
+        # Part of the bucket is held back for calls initiated by the user,
+        # which also jump ahead of any background calls waiting for a token.
+        self.reserve = min(reserve, burst - 1)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.urgent_waiting = 0
+        self.breaker = MerossCircuitBreaker()
+        self._cv = threading.Condition()
+
+    def _refill(self):
+        """Add the tokens accrued since the last refill."""
+        now = time.monotonic()
+        self.tokens = min(self.tokens + (now - self.updated) * self.rate,
+                          self.burst)
+        self.updated = now
+
+    def acquire(self, urgent=False, timeout=_ACQUIRE_TIMEOUT):
+        """
+        Take a token, waiting for one if necessary.
+
+        urgent -- whether the call was initiated by the user
+        timeout -- maximum number of seconds to wait
+
+        Returns whether or not a token was taken.
+        """
+        deadline = time.monotonic() + timeout
+        floor = 1 if urgent else 1 + self.reserve
+
+        with self._cv:
+            if urgent:
+                self.urgent_waiting += 1
+
+            try:
+                while True:
+                    self._refill()
+
+                    if self.tokens >= floor and \
+                            (urgent or self.urgent_waiting == 0):
+                        self.tokens -= 1
+                        return True
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+
+                    self._cv.wait(min(
+                        max((floor - self.tokens) / self.rate, 0.01),
+                        remaining
+                    ))
+            finally:
+                if urgent:
+                    self.urgent_waiting -= 1
+                    self._cv.notify_all()
+
+    def available(self):
+        """Get the number of tokens currently in the bucket."""
+        with self._cv:
+            self._refill()
+            return self.tokens
+
+    def poll_delay(self):
+        """
+        Determine how long background polling should hold off.
+
+        Returns the number of seconds to wait, or 0 if polling may go ahead.
+        """
+        delay = self.breaker.retry_after()
+        if delay > 0:
+            return delay
+
+        with self._cv:
+            self._refill()
+            if self.tokens >= 1 + self.reserve and self.urgent_waiting == 0:
+                return 0
+
+            return max((1 + self.reserve - self.tokens) / self.rate, 0.1)
+
+    def call(self, meross_dev, execute, command, namespace, payload, *args,
+             **kwargs):
+        """
+        Send a cloud command, if the budget and the circuit breaker allow.
+
+        meross_dev -- the meross device object the command is for
+        execute -- the meross_iot execute_command() method to send it with
+        command -- the method, e.g. 'GET' or 'SET'
+        namespace -- the namespace, e.g. 'Appliance.System.All'
+        payload -- the payload, as a dictionary
+
+        Returns the response payload.
+        """
+        # meross_iot refuses commands to offline devices without going to
+        # the cloud, so those neither cost a token nor count as failures.
+        if kwargs.get('online_check', True) and not meross_dev.online:
+            return execute(command, namespace, payload, *args, **kwargs)
+
+        urgent = is_urgent()
+        if not self.breaker.allow(urgent):
+            metrics.inc('meross_rate_limited_total', reason='circuit')
+            raise MerossCloudUnavailable('Circuit open')
+
+        if not self.acquire(urgent):
+            self.breaker.release()
+            metrics.inc('meross_rate_limited_total', reason='rate')
+            raise MerossCloudUnavailable('Rate limited')
+
+        try:
+            response = execute(command, namespace, payload, *args, **kwargs)
+        except:  # noqa: E722
+            self.breaker.record_failure()
+            raise
+
+        self.breaker.record_success()
+        return response
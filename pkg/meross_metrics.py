@@ -0,0 +1,256 @@
+"""Meross adapter for WebThings Gateway."""
+
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import bisect
+import threading
+import time
+
+
+_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_METRICS = {
+    'meross_call_seconds': (
+        'histogram',
+        'Latency of meross_iot device commands.',
+    ),
+    'meross_call_errors_total': (
+        'counter',
+        'Failed meross_iot device commands.',
+    ),
+    'meross_notification_seconds': (
+        'histogram',
+        'Latency of notifications sent to the gateway.',
+    ),
+    'meross_event_dispatch_seconds': (
+        'histogram',
+        'Latency of dispatching meross_iot push events.',
+    ),
+    'meross_poll_seconds': (
+        'histogram',
+        'Duration of device polls.',
+    ),
+    'meross_poll_overruns_total': (
+        'counter',
+        'Device polls that took longer than their interval.',
+    ),
+    'meross_threads': (
+        'gauge',
+        'Number of live threads in the adapter process.',
+    ),
+    'meross_scheduler_jobs': (
+        'gauge',
+        'Number of jobs owned by the scheduler.',
+    ),
+    'meross_scheduler_backlog': (
+        'gauge',
+        'Number of scheduler tasks waiting for a worker.',
+    ),
+    'meross_cloud_tokens': (
+        'gauge',
+        'Number of cloud calls the rate limiter allows right now.',
+    ),
+    'meross_circuit_open': (
+        'gauge',
+        'Whether the circuit breaker is refusing cloud calls.',
+    ),
+    'meross_rate_limited_total': (
+        'counter',
+        'Cloud calls refused by the rate limiter or circuit breaker.',
+    ),
+    'meross_pending_commands': (
+        'gauge',
+        'Number of property writes waiting to be sent.',
+    ),
+}
+
+
+def format_labels(labels):
+    """
+    Format a label set for the Prometheus text format.
+
+    labels -- tuple of (name, value) pairs
+    """
+    if len(labels) == 0:
+        return ''
+
+    return '{{{}}}'.format(','.join(
+        '{}="{}"'.format(
+            k,
+            str(v).replace('\\', '\\\\').replace('"', '\\"')
+        )
+        for k, v in labels
+    ))
+
+
+class MerossHistogram:
+    """Latency histogram with fixed buckets."""
+
+    def __init__(self):
+        """Initialize the object."""
+        self.counts = [0] * (len(_BUCKETS) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        """
+        Record a value.
+
+        value -- the value to record, in seconds
+        """
+        self.counts[bisect.bisect_left(_BUCKETS, value)] += 1
+        self.sum += value
+
+
+class MerossMetrics:
+    """Registry of the adapter's metrics."""
+
+    def __init__(self):
+        """Initialize the object."""
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.gauges = {}
+
+    def inc(self, name, **labels):
+        """
+        Increment a counter.
+
+        name -- name of the counter
+        labels -- labels of the series
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + 1
+
+    def observe(self, name, value, **labels):
+        """
+        Record a value in a histogram.
+
+        name -- name of the histogram
+        value -- the value to record, in seconds
+        labels -- labels of the series
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = MerossHistogram()
+
+            self.histograms[key].observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """
+        Record how long a block took in a histogram.
+
+        name -- name of the histogram
+        labels -- labels of the series
+        """
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, time.monotonic() - start, **labels)
+
+    def gauge(self, name, func):
+        """
+        Register a gauge, read when the metrics are rendered.
+
+        name -- name of the gauge
+        func -- callable returning the current value
+        """
+        self.gauges[name] = func
+
+    def render(self):
+        """Render all metrics in the Prometheus text format."""
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = {
+                k: (list(v.counts), v.sum) for k, v in self.histograms.items()
+            }
+
+        series = {}
+        for (name, labels), value in counters.items():
+            series.setdefault(name, []).append(
+                '{}{} {}'.format(name, format_labels(labels), value)
+            )
+
+        for (name, labels), (counts, total) in histograms.items():
+            lines = series.setdefault(name, [])
+            cumulative = 0
+            for bound, count in zip(_BUCKETS + ('+Inf',), counts):
+                cumulative += count
+                lines.append('{}_bucket{} {}'.format(
+                    name,
+                    format_labels(labels + (('le', bound),)),
+                    cumulative
+                ))
+
+            lines.append('{}_sum{} {}'.format(name, format_labels(labels),
+                                              total))
+            lines.append('{}_count{} {}'.format(name, format_labels(labels),
+                                                cumulative))
+
+        for name, func in list(self.gauges.items()):
+            series[name] = ['{} {}'.format(name, func())]
+
+        output = []
+        for name in sorted(series.keys()):
+            if name in _METRICS:
+                kind, description = _METRICS[name]
+                output.append('# HELP {} {}'.format(name, description))
+                output.append('# TYPE {} {}'.format(name, kind))
+
+            output.extend(series[name])
+
+        return '\n'.join(output) + '\n'
+
+
+metrics = MerossMetrics()
+metrics.gauge('meross_threads', threading.active_count)
+
+
+class MerossMetricsServer:
+    """HTTP server exporting the metrics for Prometheus."""
+
+    def __init__(self, port, host='127.0.0.1'):
+        """
+        Initialize the object.
+
+        port -- the port to listen on
+        host -- the address to listen on
+        """
+        class Handler(BaseHTTPRequestHandler):
+            """Request handler for the /metrics endpoint."""
+
+            def do_GET(self):
+                """Handle a GET request."""
+                if self.path != '/metrics':
+                    self.send_error(404)
+                    return
+
+                data = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type',
+                                 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, fmt, *args):
+                """Silence the default per-request logging."""
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+
+        self.thread = threading.Thread(
+            target=self.server.serve_forever,
+            name='meross-metrics'
+        )
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """Stop the server."""
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,77 @@
+"""Meross adapter for WebThings Gateway."""
+
+import time
+
+from .meross_metrics import metrics
+from .meross_transport import MerossTransport
+
+
+class MerossCommandPipeline:
+    """The stages every command of a meross device object goes through."""
+
+    def __init__(self, meross_dev, limiter, key=None):
+        """
+        Initialize the object.
+
+        Commands are timed, then sent over the local network if the device
+        can be reached there, and otherwise to the cloud, within the rate
+        budget of the account.
+
+        meross_dev -- the meross device object whose commands to route
+        limiter -- the rate limiter of the account the device belongs to
+        key -- the account key used to sign local messages, or None to only
+               use the cloud
+        """
+        self.meross_dev = meross_dev
+        self.limiter = limiter
+        self.cloud = meross_dev.execute_command
+
+        self.transport = None
+        if key is not None:
+            self.transport = MerossTransport(meross_dev, key, self.send_cloud)
+
+        # All of the meross_iot device methods send through
+        # execute_command(), so replacing it routes every command.
+        meross_dev.execute_command = self.execute
+
+    def execute(self, command, namespace, payload, *args, **kwargs):
+        """
+        Execute a command, recording how long it took.
+
+        This has the signature of the meross_iot execute_command() method.
+
+        command -- the method, e.g. 'GET' or 'SET'
+        namespace -- the namespace, e.g. 'Appliance.System.All'
+        payload -- the payload, as a dictionary
+        """
+        labels = {
+            'device': self.meross_dev.uuid,
+            'call': namespace,
+            'method': command,
+        }
+
+        start = time.monotonic()
+        try:
+            if self.transport is not None:
+                return self.transport.execute(command, namespace, payload,
+                                              *args, **kwargs)
+
+            return self.send_cloud(command, namespace, payload, *args,
+                                   **kwargs)
+        except:  # noqa: E722
+            metrics.inc('meross_call_errors_total', **labels)
+            raise
+        finally:
+            metrics.observe('meross_call_seconds', time.monotonic() - start,
+                            **labels)
+
+    def send_cloud(self, command, namespace, payload, *args, **kwargs):
+        """
+        Send a command to the cloud, within the rate budget of the account.
+
+        command -- the method, e.g. 'GET' or 'SET'
+        namespace -- the namespace, e.g. 'Appliance.System.All'
+        payload -- the payload, as a dictionary
+        """
+        return self.limiter.call(self.meross_dev, self.cloud, command,
+                                 namespace, payload, *args, **kwargs)
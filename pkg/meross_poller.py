@@ -0,0 +1,241 @@
+"""Meross adapter for WebThings Gateway."""
+
+import time
+
+from .meross_limiter import MerossCloudUnavailable
+from .meross_metrics import metrics
+
+
+_OFFLINE_BACKOFF_MAX = 300
+_PUSH_QUIET_THRESHOLD = 60
+
+
+class MerossPoller:
+    """Polls one physical device on behalf of all of its channel devices."""
+
+    def __init__(self, scheduler, limiter, meross_dev, interval, key,
+                 lane=None):
+        """
+        Initialize the object.
+
+        scheduler -- the scheduler running this poller
+        limiter -- the rate limiter guarding cloud calls
+        meross_dev -- the meross device object to poll
+        interval -- number of seconds between polls
+        key -- unique key of the polling job
+        lane -- name of the scheduler lane the polls run on
+        """
+        self.scheduler = scheduler
+        self.limiter = limiter
+        self.meross_dev = meross_dev
+        self.key = key
+        self.lane = lane
+        self.interval = interval
+        self.offline_backoff = interval
+        self.quiet_threshold = _PUSH_QUIET_THRESHOLD
+        self.last_push = None
+        self.transport = None
+        self.devices = []
+
+        # Windows of faster polling, by key: monotonic end time and interval.
+        self.fast = {}
+
+    def add(self, device):
+        """
+        Add a channel device, starting to poll if it is the first one.
+
+        device -- the device to add
+        """
+        device.poller = self
+        self.devices.append(device)
+
+        if len(self.devices) == 1:
+            self.scheduler.add(self.key, self.poll, self.interval,
+                               lane=self.lane)
+
+    def remove(self, device):
+        """
+        Remove a channel device, stopping to poll if it was the last one.
+
+        device -- the device to remove
+        """
+        if device in self.devices:
+            self.devices.remove(device)
+
+        if len(self.devices) == 0:
+            self.scheduler.remove(self.key)
+
+    def wake(self):
+        """Reset the offline backoff and poll as soon as possible."""
+        self.offline_backoff = self.interval
+        self.last_push = None
+        self.scheduler.wake(self.key)
+
+    def expedite(self, key, interval, duration):
+        """
+        Poll faster for a while, starting right away.
+
+        key -- unique key of the window, to end it early
+        interval -- number of seconds between polls during the window
+        duration -- maximum number of seconds the window lasts
+        """
+        self.fast[key] = (time.monotonic() + duration, interval)
+        self.scheduler.wake(self.key)
+
+    def relax(self, key):
+        """
+        End a window of faster polling.
+
+        key -- key of the window
+        """
+        self.fast.pop(key, None)
+
+    def fast_delay(self):
+        """
+        Get the number of seconds until the next poll, while polling faster.
+
+        Returns None if no window of faster polling is open.
+        """
+        now = time.monotonic()
+        intervals = []
+        for key, (end, interval) in list(self.fast.items()):
+            if end > now:
+                intervals.append(interval)
+            else:
+                self.fast.pop(key, None)
+
+        if len(intervals) == 0:
+            return None
+
+        return min(intervals)
+
+    def expedited(self):
+        """Determine whether a window of faster polling is open."""
+        return self.fast_delay() is not None
+
+    def handle_push(self):
+        """Record that a push event was received from the device."""
+        self.last_push = time.monotonic()
+
+    def push_delay(self, devices):
+        """
+        Determine how long polling can be skipped thanks to recent pushes.
+
+        devices -- the channel devices being polled
+
+        Returns the number of seconds until the device goes quiet, or None
+        if it should be polled now.
+        """
+        if self.last_push is None:
+            return None
+
+        if not all(d.push_covers_status() for d in devices):
+            return None
+
+        remaining = self.last_push + self.quiet_threshold - time.monotonic()
+        if remaining <= 0:
+            return None
+
+        return max(remaining, self.interval)
+
+    def poll(self):
+        """
+        Poll the device, recording how long it took.
+
+        Returns the number of seconds until the next poll, if not the default.
+        """
+        start = time.monotonic()
+        try:
+            return self.poll_status()
+        finally:
+            elapsed = time.monotonic() - start
+            metrics.observe('meross_poll_seconds', elapsed)
+
+            if elapsed > self.interval:
+                metrics.inc('meross_poll_overruns_total')
+
+    def poll_status(self):
+        """
+        Fetch the device status once and fan it out to all channels.
+
+        Returns the number of seconds until the next poll, if not the default.
+        """
+        devices = list(self.devices)
+        if len(devices) == 0:
+            return
+
+        # Devices restored from the cache can't be polled until the cloud
+        # connection is up and they are switched over to the live object.
+        if getattr(self.meross_dev, 'cached', False):
+            return
+
+        if not self.meross_dev.online:
+            return self.handle_offline(devices)
+
+        # While pushes keep arriving, they carry everything a poll would
+        # fetch, so only fall back to polling once the device goes quiet.
+        delay = self.push_delay(devices)
+        if delay is not None:
+            return delay
+
+        # Hold off while the cloud is throttled or failing, unless the device
+        # can be reached directly.
+        if self.transport is None or self.transport.lan is None:
+            delay = self.limiter.poll_delay()
+            if delay > 0:
+                return self.throttled_delay(delay)
+
+        if self.transport is not None:
+            self.transport.discover()
+
+        try:
+            status = devices[0].fetch_status()
+
+            for device in devices:
+                device.handle_status(status)
+                device.set_connected(True)
+
+                if self.transport is not None:
+                    device.handle_transport(self.transport)
+        except MerossCloudUnavailable:
+            # The device may well be fine, the cloud just can't be asked.
+            return self.throttled_delay(self.limiter.poll_delay())
+        except:  # noqa: E722
+            # catching the exceptions from meross_iot just lead to more
+            # exceptions being thrown. cool.
+            return self.handle_offline(devices)
+
+        self.offline_backoff = self.interval
+        return self.fast_delay()
+
+    def throttled_delay(self, delay):
+        """
+        Determine when to poll next, while the cloud is holding polls back.
+
+        delay -- number of seconds the rate limiter asks to wait
+
+        Returns the number of seconds until the next poll.
+        """
+        # A window of faster polling, e.g. while a door travels, keeps its
+        # own interval rather than falling back to the normal one.
+        interval = self.fast_delay()
+        if interval is None:
+            interval = self.interval
+
+        return max(delay, interval)
+
+    def handle_offline(self, devices):
+        """
+        Mark all channels as offline and back off from polling.
+
+        devices -- the channel devices to mark
+
+        Returns the number of seconds until the next poll.
+        """
+        for device in devices:
+            device.set_connected(False)
+
+        delay = self.offline_backoff
+        self.offline_backoff = min(self.offline_backoff * 2,
+                                   _OFFLINE_BACKOFF_MAX)
+        return delay
@@ -1,12 +1,19 @@
 """Meross adapter for WebThings Gateway."""
 
 from gateway_addon import Property
+import threading
+import time
+
+
+_MAX_STALENESS = 300
+_CONFIRM_TIMEOUT = 15
 
 
 class MerossProperty(Property):
     """Meross property type."""
 
-    def __init__(self, device, name, description, value):
+    def __init__(self, device, name, description, value, deadband=0,
+                 relative_deadband=0):
         """
         Initialize the object.
 
@@ -14,118 +21,187 @@ class MerossProperty(Property):
         name -- name of the property
         description -- description of the property, as a dictionary
         value -- current value of this property
+        deadband -- absolute change below which numeric updates are not
+                    notified
+        relative_deadband -- change, as a fraction of the last notified
+                             value, below which numeric updates are not
+                             notified
         """
         Property.__init__(self, device, name, description)
+        self.deadband = deadband
+        self.relative_deadband = relative_deadband
+        self.lock = threading.Lock()
         self.set_cached_value(value)
 
-    def update(self, value):
-        """Update the current value, if necessary."""
+        # The initial value goes out with the device description.
+        self.notified_value = self.value
+        self.last_notified = time.monotonic()
+
+        # Last value reported by the device, and the value it is expected to
+        # report for a write that is not confirmed yet, along with the
+        # sequence number of that write.
+        self.reported = self.value
+        self.pending = None
+        self.writes = 0
+
+    def restore(self, value):
+        """
+        Restore a last-known value without notifying it.
+
+        value -- the value to restore
+        """
         self.set_cached_value(value)
-        self.device.notify_property_changed(self)
+        self.notified_value = self.value
+        self.reported = self.value
 
+    def changed(self, value):
+        """
+        Determine whether a value differs enough from the last notified one.
 
-class MerossBulbProperty(MerossProperty):
-    """Meross bulb property type."""
+        value -- the value to check
+        """
+        last = self.notified_value
+        if isinstance(value, bool) or isinstance(last, bool) or \
+                not isinstance(value, (int, float)) or \
+                not isinstance(last, (int, float)):
+            return value != last
 
-    def set_value(self, value):
+        threshold = max(self.deadband, self.relative_deadband * abs(last))
+        if threshold == 0:
+            return value != last
+
+        return abs(value - last) >= threshold
+
+    def update(self, value, force=False):
         """
-        Set the current value of the property.
+        Update the current value, if necessary.
 
-        value -- the value to set
+        A pending write is confirmed once the device reports the expected
+        value. Until then, other values are taken to predate the write, and
+        are not notified.
+
+        value -- the new value, as reported by the device
+        force -- whether to notify even if the value did not change
         """
-        color_mode_prop = None
-        if 'colorMode' in self.device.properties:
-            color_mode_prop = self.device.properties['colorMode']
+        # Polls, pushes and writes update properties from different threads,
+        # so check and record the notified value in one go.
+        with self.lock:
+            self.reported = value
+
+            if self.pending is not None:
+                if value != self.pending[0]:
+                    return
+
+                self.pending = None
+
+            self.set_cached_value(value)
+
+            now = time.monotonic()
+            if not force and not self.changed(self.value) and \
+                    now - self.last_notified < _MAX_STALENESS:
+                return
 
-        if self.name == 'on':
-            success = False
-            if value:
-                success = self.device.meross_dev.turn_on(
-                    channel=self.device.channel
-                )
+            self.notified_value = self.value
+            self.last_notified = now
+
+        self.device.notify_property_changed(self)
+
+    def expect(self, value):
+        """
+        Show a written value right away, until the device confirms it.
+
+        If the device doesn't report the value in time, the property rolls
+        back to the last value it did report.
+
+        value -- the value written
+        """
+        expected = self.device.expected_value(self.name, value)
+
+        with self.lock:
+            self.writes += 1
+            seq = self.writes
+
+            if expected == self.reported:
+                self.pending = None
             else:
-                success = self.device.meross_dev.turn_off(
-                    channel=self.device.channel
-                )
-
-            if success:
-                self.update(value)
-        elif self.name == 'color':
-            rgb = int(value[1:], 16)
-            self.device.meross_dev.set_light_color(
-                channel=self.device.channel,
-                capacity=5,
-                rgb=rgb,
-                luminance=100,
-            )
-            self.update(value)
-
-            # update the colorMode property
-            if color_mode_prop is not None:
-                color_mode_prop.set_cached_value('color')
-                self.device.notify_property_changed(color_mode_prop)
-        elif self.name == 'colorTemperature':
-            temperature = int((value - 2700) / (6500 - 2700) * 100)
-
-            luminance = 100
-            if 'brightness' in self.device.properties:
-                luminance = self.device.properties['brightness'].value
-
-            self.device.meross_dev.set_light_color(
-                channel=self.device.channel,
-                capacity=6,
-                temperature=temperature,
-                luminance=luminance,
-            )
-            self.update(value)
-
-            # update the colorMode property
-            if color_mode_prop is not None:
-                color_mode_prop.set_cached_value('temperature')
-                self.device.notify_property_changed(color_mode_prop)
-        elif self.name == 'brightness':
-            capacity = 4
-            temperature = -1
-
-            if 'colorTemperature' in self.device.properties:
-                capacity = 6
-                temperature = int(
-                    (self.device.properties['colorTemperature'].value - 2700) /
-                    (6500 - 2700) *
-                    100
-                )
-
-            self.device.meross_dev.set_light_color(
-                channel=self.device.channel,
-                capacity=capacity,
-                luminance=value,
-                temperature=temperature,
+                self.pending = (expected, seq)
+
+            pending = self.pending
+
+            self.set_cached_value(value)
+            self.notified_value = self.value
+            self.last_notified = time.monotonic()
+
+        self.device.notify_property_changed(self)
+
+        if pending is not None:
+            self.device.adapter.scheduler.call_later(
+                '{}-{}-{}'.format(self.device.id, self.name, seq),
+                lambda: self.expire(seq),
+                _CONFIRM_TIMEOUT
             )
-            self.update(value)
 
+    def expire(self, seq):
+        """
+        Roll back a write that the device didn't confirm in time.
 
-class MerossPlugProperty(MerossProperty):
-    """Meross plug property type."""
+        seq -- sequence number of the write
+        """
+        self.revert(lambda pending: pending[1] == seq)
+
+    def rollback(self, value):
+        """
+        Roll back a write that failed, unless a later one superseded it.
+
+        value -- the value written
+        """
+        expected = self.device.expected_value(self.name, value)
+
+        self.revert(lambda pending: pending[0] == expected)
+
+    def revert(self, matches):
+        """
+        Go back to the last value reported by the device.
+
+        matches -- callable checking whether the pending write is the one to
+                   roll back
+        """
+        with self.lock:
+            if self.pending is None or not matches(self.pending):
+                return
+
+            self.pending = None
+            self.set_cached_value(self.reported)
+            self.notified_value = self.value
+            self.last_notified = time.monotonic()
+
+        self.device.notify_property_changed(self)
+        self.device.handle_rollback(self.name)
 
     def set_value(self, value):
         """
         Set the current value of the property.
 
+        The new value is notified right away. The write is queued on the
+        device and sent in the background, so that a slow cloud round-trip
+        doesn't block the gateway.
+
         value -- the value to set
         """
-        if self.name == 'on':
-            success = False
-            if value:
-                success = self.device.meross_dev.turn_on(
-                    channel=self.device.channel
-                )
-            else:
-                success = self.device.meross_dev.turn_off(
-                    channel=self.device.channel
-                )
+        self.expect(value)
+        self.device.commands.put(self.name, value)
+
+
+class MerossBulbProperty(MerossProperty):
+    """Meross bulb property type."""
+
+    pass
+
 
-            if success:
-                self.update(value)
+class MerossPlugProperty(MerossProperty):
+    """Meross plug property type."""
+
+    pass
 
 
 class MerossOpenerProperty(MerossProperty):
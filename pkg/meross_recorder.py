@@ -0,0 +1,217 @@
+"""Meross adapter for WebThings Gateway."""
+
+import mmap
+import os
+import struct
+import threading
+import time
+
+
+# Each sample is a fixed-width little-endian record: time in seconds since
+# the epoch, then power in watts, voltage in volts and current in amperes.
+_RECORD = struct.Struct('<dfff')
+_RETENTION_DAYS = 30
+_MAX_POINTS = 1000
+_SUFFIX = '.bin'
+
+
+def _segment_name(timestamp):
+    """
+    Get the name of the file holding the samples of one UTC day.
+
+    timestamp -- time of a sample, in seconds since the epoch
+    """
+    return time.strftime('%Y-%m-%d', time.gmtime(timestamp)) + _SUFFIX
+
+
+def _bisect(buf, count, timestamp):
+    """
+    Find the first record at or after a point in time.
+
+    buf -- buffer of records, in chronological order
+    count -- number of records in the buffer
+    timestamp -- the point in time, in seconds since the epoch
+    """
+    lo = 0
+    hi = count
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if _RECORD.unpack_from(buf, mid * _RECORD.size)[0] < timestamp:
+            lo = mid + 1
+        else:
+            hi = mid
+
+    return lo
+
+
+class MerossEnergyRecorder:
+    """Append-only store of plug electricity samples, one file per day."""
+
+    def __init__(self, path, retention_days=_RETENTION_DAYS):
+        """
+        Initialize the object.
+
+        path -- directory holding one subdirectory of files per device
+        retention_days -- number of daily files kept per device
+        """
+        self.path = path
+        self.retention_days = retention_days
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+
+    def record(self, device_id, timestamp, power, voltage, current):
+        """
+        Buffer a sample until the next flush.
+
+        device_id -- ID of the device
+        timestamp -- time of the sample, in seconds since the epoch
+        power -- power, in watts
+        voltage -- voltage, in volts
+        current -- current, in amperes
+        """
+        key = (device_id, _segment_name(timestamp))
+        record = _RECORD.pack(timestamp, power, voltage, current)
+
+        with self.lock:
+            if key in self.pending:
+                self.pending[key] += record
+            else:
+                self.pending[key] = bytearray(record)
+
+    def flush(self):
+        """Append the buffered samples to their files."""
+        # Samples keep coming in while the files are written, and two
+        # flushes at once must not interleave their writes.
+        with self.write_lock:
+            with self.lock:
+                pending = self.pending
+                self.pending = {}
+
+            for (device_id, name), records in pending.items():
+                directory = os.path.join(self.path, device_id)
+
+                try:
+                    os.makedirs(directory, exist_ok=True)
+
+                    with open(os.path.join(directory, name), 'ab') as f:
+                        # Drop a partial record left by an interrupted write,
+                        # so that the new ones stay aligned.
+                        size = f.seek(0, os.SEEK_END)
+                        if size % _RECORD.size:
+                            f.truncate(size - size % _RECORD.size)
+
+                        f.write(records)
+                except OSError:
+                    continue
+
+                self.prune(directory)
+
+    def prune(self, directory):
+        """
+        Delete the files of a device past the retention period.
+
+        directory -- directory of the device
+        """
+        try:
+            names = sorted(
+                n for n in os.listdir(directory) if n.endswith(_SUFFIX)
+            )
+
+            for name in names[:-self.retention_days]:
+                os.remove(os.path.join(directory, name))
+        except OSError:
+            pass
+
+    def query(self, device_id, start, end, interval):
+        """
+        Read the samples of a device, averaged over fixed intervals.
+
+        device_id -- ID of the device
+        start -- start of the range, in seconds since the epoch
+        end -- end of the range, in seconds since the epoch
+        interval -- length of each interval, in seconds; widened if the
+                    range would otherwise have too many intervals
+
+        Returns a dictionary of columns, with one row per interval that has
+        samples: the interval start time, mean power, maximum power, mean
+        voltage and mean current.
+        """
+        self.flush()
+
+        interval = max(interval, (end - start) / _MAX_POINTS, 1)
+        buckets = {}
+
+        for buf, lo, hi in self.segments(device_id, start, end):
+            for timestamp, power, voltage, current in _RECORD.iter_unpack(
+                    buf[lo * _RECORD.size:hi * _RECORD.size]):
+                index = int((timestamp - start) // interval)
+                bucket = buckets.get(index)
+                if bucket is None:
+                    buckets[index] = [1, power, power, voltage, current]
+                else:
+                    bucket[0] += 1
+                    bucket[1] += power
+                    bucket[2] = max(bucket[2], power)
+                    bucket[3] += voltage
+                    bucket[4] += current
+
+        columns = {
+            'time': [],
+            'power': [],
+            'maximumPower': [],
+            'voltage': [],
+            'current': [],
+        }
+
+        for index in sorted(buckets):
+            count, power, maximum, voltage, current = buckets[index]
+            columns['time'].append(start + index * interval)
+            columns['power'].append(round(power / count, 1))
+            columns['maximumPower'].append(round(maximum, 1))
+            columns['voltage'].append(round(voltage / count, 1))
+            columns['current'].append(round(current / count, 3))
+
+        columns['interval'] = interval
+        return columns
+
+    def segments(self, device_id, start, end):
+        """
+        Map the files of a device that cover a range of time.
+
+        device_id -- ID of the device
+        start -- start of the range, in seconds since the epoch
+        end -- end of the range, in seconds since the epoch
+
+        Yields the mapped contents of each file, along with the indices of
+        the first record in the range and of the first one past it.
+        """
+        directory = os.path.join(self.path, device_id)
+        first = _segment_name(start)
+        last = _segment_name(end)
+
+        try:
+            names = sorted(os.listdir(directory))
+        except OSError:
+            return
+
+        for name in names:
+            if not name.endswith(_SUFFIX) or name < first or name > last:
+                continue
+
+            try:
+                with open(os.path.join(directory, name), 'rb') as f:
+                    # Ignore a partial record left by an interrupted write.
+                    count = os.fstat(f.fileno()).st_size // _RECORD.size
+                    if count == 0:
+                        continue
+
+                    buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):
+                continue
+
+            with buf:
+                lo = _bisect(buf, count, start)
+                hi = _bisect(buf, count, end)
+                if lo < hi:
+                    yield buf, lo, hi
@@ -0,0 +1,419 @@
+"""Meross adapter for WebThings Gateway."""
+
+from concurrent.futures import Future, ThreadPoolExecutor
+import asyncio
+import random
+import threading
+
+
+_MAX_WORKERS = 4
+_URGENT_WORKERS = 16
+_JITTER = 0.1
+
+
+class MerossJob:
+    """A periodic job owned by the scheduler."""
+
+    def __init__(self, key, func, interval, executor):
+        """
+        Initialize the object.
+
+        key -- unique key of this job
+        func -- callable to run, optionally returning the next delay
+        interval -- default number of seconds between runs, or None for a
+                    job that only runs once
+        executor -- the worker pool of the lane the job runs on
+        """
+        self.key = key
+        self.func = func
+        self.interval = interval
+        self.executor = executor
+        self.handle = None
+        self.running = False
+        self.woken = False
+
+
+class MerossScheduler:
+    """Event loop owning all timers, running blocking jobs on worker lanes."""
+
+    def __init__(self, max_workers=_MAX_WORKERS,
+                 urgent_workers=_URGENT_WORKERS):
+        """
+        Initialize the object.
+
+        max_workers -- maximum number of jobs running at the same time on the
+                       default lane
+        urgent_workers -- number of workers of the 'urgent' lane
+        """
+        # The loop runs on its own thread and is the only one to touch the
+        # jobs. The public methods can be called from any thread, and hand
+        # over to the loop. Blocking calls run on the worker pools of lanes,
+        # each bounded on its own, so that one kind of work can't hold up
+        # another. Urgent tasks get a lane of their own, so that they don't
+        # queue up behind polls stuck on slow devices. It is large enough for
+        # a group write to reach all members in a single round-trip; the
+        # threads of a lane are only started when needed.
+        self.max_workers = max_workers
+        self.loop = asyncio.new_event_loop()
+        self._jobs = {}
+        self._lanes = {}
+        self._futures = set()
+        self._cv = threading.Condition()
+        self._backlog = 0
+        self._active = 0
+        self._running = True
+
+        self.add_lane(None, max_workers)
+        self.add_lane('urgent', urgent_workers)
+
+        self._thread = threading.Thread(
+            target=self._run,
+            name='meross-loop'
+        )
+        self._thread.daemon = True
+        self._thread.start()
+
+    def call_soon(self, func, *args):
+        """
+        Run a non-blocking callable on the event loop.
+
+        func -- callable to run
+        args -- arguments to pass
+        """
+        if self._running:
+            self.loop.call_soon_threadsafe(func, *args)
+
+    def add_lane(self, name, max_workers):
+        """
+        Add a lane of workers, unless there is one by that name already.
+
+        name -- name of the lane
+        max_workers -- maximum number of tasks running at the same time on
+                       the lane; 1 runs them one by one, in order
+        """
+        with self._cv:
+            if name in self._lanes:
+                return
+
+            prefix = 'meross-worker'
+            if name is not None:
+                prefix = 'meross-{}'.format(name.replace(' ', '-'))
+
+            self._lanes[name] = ThreadPoolExecutor(
+                max_workers=max_workers,
+                thread_name_prefix=prefix
+            )
+
+    def add(self, key, func, interval, lane=None):
+        """
+        Add a periodic job.
+
+        The first run is spread randomly over one interval, so that jobs
+        added at the same time don't all fire at once.
+
+        key -- unique key of the job
+        func -- callable to run, optionally returning the next delay
+        interval -- default number of seconds between runs
+        lane -- name of the lane to run on, or None for the default one
+        """
+        job = MerossJob(key, func, interval, self._lanes[lane])
+        self.call_soon(self._add, job, random.uniform(0, interval))
+
+    def call_later(self, key, func, delay, lane=None):
+        """
+        Run a one-off job after a delay, unless it is already pending.
+
+        If the job is running already, it runs once more right after.
+
+        key -- unique key of the job
+        func -- callable to run
+        delay -- number of seconds until the job runs
+        lane -- name of the lane to run on, or None for the default one
+        """
+        job = MerossJob(key, func, None, self._lanes[lane])
+        self.call_soon(self._call_later, job, delay)
+
+    def remove(self, key):
+        """
+        Remove a job.
+
+        key -- key of the job to remove
+        """
+        self.call_soon(self._remove, key)
+
+    def wake(self, key):
+        """
+        Run a job as soon as possible.
+
+        key -- key of the job to wake
+        """
+        self.call_soon(self._wake, key)
+
+    def submit(self, func, lane=None):
+        """
+        Run a one-off task on the workers of a lane.
+
+        func -- callable to run
+        lane -- name of the lane to run on, or None for the default one
+
+        Returns the concurrent.futures.Future of the task. It is cancelled if
+        the scheduler stops before the task starts.
+        """
+        executor = self._lanes[lane]
+        future = Future()
+
+        def run():
+            if not future.set_running_or_notify_cancel():
+                return
+
+            try:
+                future.set_result(func())
+            except BaseException as e:
+                future.set_exception(e)
+
+        with self._cv:
+            if not self._running:
+                future.cancel()
+                return future
+
+            self._backlog += 1
+            self._futures.add(future)
+
+        future.add_done_callback(self._forget)
+        self.call_soon(self._submit, run, executor, future)
+        return future
+
+    def job_count(self):
+        """Get the number of jobs owned by the scheduler."""
+        return len(self._jobs)
+
+    def backlog(self):
+        """Get the number of tasks waiting for a worker."""
+        return self._backlog
+
+    def stop(self, timeout=None):
+        """
+        Stop the scheduler and its workers.
+
+        Tasks that haven't started yet are dropped.
+
+        timeout -- number of seconds to wait for running tasks to finish, or
+                   None to not wait
+
+        Returns whether or not all running tasks finished.
+        """
+        with self._cv:
+            if self._running:
+                self._running = False
+                self.loop.call_soon_threadsafe(self._stop)
+
+            futures = list(self._futures)
+            lanes = list(self._lanes.values())
+
+        for future in futures:
+            future.cancel()
+
+        for executor in lanes:
+            executor.shutdown(wait=False)
+
+        if timeout is None:
+            return self._active == 0
+
+        with self._cv:
+            return self._cv.wait_for(lambda: self._active == 0, timeout)
+
+    def _run(self):
+        """Run the event loop until the scheduler is stopped."""
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def _stop(self):
+        """Cancel all jobs and stop the event loop."""
+        for job in self._jobs.values():
+            if job.handle is not None:
+                job.handle.cancel()
+
+        self._jobs.clear()
+        self.loop.stop()
+
+    def _forget(self, future):
+        """
+        Stop tracking the future of a task once it is done.
+
+        future -- the future of the task
+        """
+        with self._cv:
+            self._futures.discard(future)
+
+    def _submit(self, func, executor, future):
+        """
+        Hand a one-off task to the worker pool of its lane.
+
+        func -- callable to run, completing the future
+        executor -- the worker pool to run it on
+        future -- the future of the task
+        """
+        if self._start(func, executor) is None:
+            future.cancel()
+
+    def _add(self, job, delay):
+        """
+        Add a job, replacing any job with the same key.
+
+        job -- the job to add
+        delay -- number of seconds until the first run
+        """
+        self._remove(job.key)
+        self._jobs[job.key] = job
+        self._schedule(job, delay)
+
+    def _call_later(self, job, delay):
+        """
+        Add a one-off job, unless one with the same key is pending.
+
+        job -- the job to add
+        delay -- number of seconds until the job runs
+        """
+        existing = self._jobs.get(job.key)
+        if existing is not None:
+            if existing.running:
+                existing.woken = True
+
+            return
+
+        self._jobs[job.key] = job
+        self._schedule(job, delay)
+
+    def _remove(self, key):
+        """
+        Remove a job.
+
+        key -- key of the job to remove
+        """
+        job = self._jobs.pop(key, None)
+        if job is not None and job.handle is not None:
+            job.handle.cancel()
+            job.handle = None
+
+    def _wake(self, key):
+        """
+        Run a job as soon as possible.
+
+        key -- key of the job to wake
+        """
+        job = self._jobs.get(key)
+        if job is None:
+            return
+
+        if job.running:
+            job.woken = True
+        else:
+            self._schedule(job, 0)
+
+    def _schedule(self, job, delay):
+        """
+        Schedule the next run of a job, superseding any earlier one.
+
+        job -- the job to schedule
+        delay -- number of seconds until the job is due
+        """
+        if job.handle is not None:
+            job.handle.cancel()
+
+        job.handle = self.loop.call_later(delay, self._dispatch, job)
+
+    def _dispatch(self, job):
+        """
+        Hand a due job to the worker pool.
+
+        job -- the job to run
+        """
+        job.handle = None
+        if self._jobs.get(job.key) is not job:
+            return
+
+        with self._cv:
+            self._backlog += 1
+
+        future = self._start(job.func, job.executor)
+        if future is not None:
+            job.running = True
+            future.add_done_callback(lambda f: self._finish(job, f))
+
+    def _start(self, func, executor):
+        """
+        Hand a callable to a worker pool.
+
+        func -- callable to run
+        executor -- the worker pool to run it on
+
+        Returns the future of the run, or None if the pool was shut down.
+        """
+        try:
+            return self.loop.run_in_executor(executor, self._execute, func)
+        except RuntimeError:
+            with self._cv:
+                self._backlog -= 1
+
+            return None
+
+    def _execute(self, func):
+        """
+        Run a task once a worker picked it up.
+
+        func -- callable to run
+
+        Returns what the callable returned, or None if it failed.
+        """
+        with self._cv:
+            self._backlog -= 1
+            if not self._running:
+                return
+
+            self._active += 1
+
+        try:
+            return func()
+        except:  # noqa: E722
+            pass
+        finally:
+            with self._cv:
+                self._active -= 1
+                self._cv.notify_all()
+
+    def _finish(self, job, future):
+        """
+        Queue the next run of a job once it is done.
+
+        job -- the job that ran
+        future -- the future of the run
+        """
+        job.running = False
+        if self._jobs.get(job.key) is not job:
+            return
+
+        if job.interval is None:
+            if job.woken:
+                job.woken = False
+                self._schedule(job, 0)
+            else:
+                del self._jobs[job.key]
+
+            return
+
+        delay = None
+        if not future.cancelled() and future.exception() is None:
+            delay = future.result()
+
+        if delay is None:
+            delay = job.interval
+
+        # Spread subsequent runs a little, too, so that jobs don't drift back
+        # into lockstep.
+        delay *= random.uniform(1 - _JITTER, 1 + _JITTER)
+
+        if job.woken:
+            job.woken = False
+            delay = 0
+
+        self._schedule(job, delay)
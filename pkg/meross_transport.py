@@ -0,0 +1,189 @@
+"""Meross adapter for WebThings Gateway."""
+
+from hashlib import md5
+import json
+import time
+import urllib.request
+import uuid
+
+
+_LAN_TIMEOUT = 2
+_LAN_RETRY_INTERVAL = 300
+_LATENCY_SMOOTHING = 0.2
+
+
+def build_message(method, namespace, payload, key):
+    """
+    Build a signed Meross protocol message.
+
+    method -- the method, e.g. 'GET' or 'SET'
+    namespace -- the namespace, e.g. 'Appliance.System.All'
+    payload -- the payload, as a dictionary
+    key -- the account key used to sign the message
+    """
+    message_id = uuid.uuid4().hex
+    timestamp = int(time.time())
+    sign = md5(
+        '{}{}{}'.format(message_id, key, timestamp).encode('utf-8')
+    ).hexdigest()
+
+    return {
+        'header': {
+            'from': '/meross-adapter',
+            'messageId': message_id,
+            'method': method,
+            'namespace': namespace,
+            'payloadVersion': 1,
+            'sign': sign,
+            'timestamp': timestamp,
+        },
+        'payload': payload,
+    }
+
+
+def verify_message(message, key):
+    """
+    Check the signature of a Meross protocol message.
+
+    message -- the message, as a dictionary
+    key -- the account key the message should be signed with
+    """
+    header = message['header']
+    sign = md5('{}{}{}'.format(
+        header['messageId'],
+        key,
+        header['timestamp']
+    ).encode('utf-8')).hexdigest()
+
+    return sign == header['sign']
+
+
+class MerossLanTransport:
+    """Talks to a device directly over its local HTTP interface."""
+
+    def __init__(self, host, key, timeout=_LAN_TIMEOUT):
+        """
+        Initialize the object.
+
+        host -- address of the device, optionally with a port
+        key -- the account key used to sign messages
+        timeout -- number of seconds to wait for a response
+        """
+        self.url = 'http://{}/config'.format(host)
+        self.key = key
+        self.timeout = timeout
+
+    def execute(self, method, namespace, payload):
+        """
+        Execute a command on the device.
+
+        method -- the method, e.g. 'GET' or 'SET'
+        namespace -- the namespace, e.g. 'Appliance.System.All'
+        payload -- the payload, as a dictionary
+
+        Returns the response payload.
+        """
+        data = json.dumps(
+            build_message(method, namespace, payload, self.key)
+        ).encode('utf-8')
+
+        request = urllib.request.Request(
+            self.url,
+            data=data,
+            headers={'Content-Type': 'application/json'}
+        )
+
+        with urllib.request.urlopen(request, timeout=self.timeout) as f:
+            response = json.loads(f.read().decode('utf-8'))
+
+        if response['header']['method'] == 'ERROR':
+            raise ValueError('Device returned an error: {}'.format(
+                response['payload']
+            ))
+
+        return response['payload']
+
+
+class MerossTransport:
+    """Routes the commands of a device over the LAN, falling back to cloud."""
+
+    def __init__(self, meross_dev, key, cloud_execute):
+        """
+        Initialize the object.
+
+        meross_dev -- the meross device object to route commands for
+        key -- the account key used to sign local messages
+        cloud_execute -- callable sending a command to the cloud, with the
+                         signature of the meross_iot execute_command() method
+        """
+        self.meross_dev = meross_dev
+        self.key = key
+        self.cloud_execute = cloud_execute
+        self.lan = None
+        self.lan_failed = None
+        self.mode = 'cloud'
+        self.latency = {}
+
+    def discover(self):
+        """Look up the local address of the device, if due."""
+        if self.lan is not None:
+            return
+
+        if self.lan_failed is not None and \
+                time.monotonic() - self.lan_failed < _LAN_RETRY_INTERVAL:
+            return
+
+        try:
+            data = self.cloud_execute('GET', 'Appliance.System.All', {},
+                                      online_check=False)
+            host = data['all']['system']['firmware']['innerIp']
+        except:  # noqa: E722
+            self.lan_failed = time.monotonic()
+            return
+
+        self.lan = MerossLanTransport(host, self.key)
+
+    def record(self, mode, start):
+        """
+        Record the latency of a command.
+
+        mode -- the transport the command went over, 'lan' or 'cloud'
+        start -- monotonic time at which the command started
+        """
+        elapsed = (time.monotonic() - start) * 1000
+
+        if mode in self.latency:
+            elapsed = self.latency[mode] + \
+                _LATENCY_SMOOTHING * (elapsed - self.latency[mode])
+
+        self.latency[mode] = elapsed
+        self.mode = mode
+
+    def execute(self, command, namespace, payload, callback=None, **kwargs):
+        """
+        Execute a command, preferring the local network.
+
+        This has the signature of the meross_iot execute_command() method.
+
+        command -- the method, e.g. 'GET' or 'SET'
+        namespace -- the namespace, e.g. 'Appliance.System.All'
+        payload -- the payload, as a dictionary
+        callback -- optional callback for asynchronous cloud commands
+        """
+        if self.lan is not None and callback is None:
+            start = time.monotonic()
+            try:
+                response = self.lan.execute(command, namespace, payload)
+                self.record('lan', start)
+                return response
+            except (OSError, ValueError, KeyError):
+                # Fall back to the cloud, and look the device up again later
+                # in case its address changed.
+                self.lan = None
+                self.lan_failed = time.monotonic()
+
+        start = time.monotonic()
+        response = self.cloud_execute(command, namespace, payload,
+                                      callback=callback, **kwargs)
+        self.record('cloud', start)
+        return response
@@ -0,0 +1,258 @@
+"""
+Offline benchmark of the adapter against a simulated Meross fleet.
+
+Each fleet size runs in its own process, so that thread counts and memory
+usage don't bleed from one run into the next.
+"""
+
+from os import path
+import argparse
+import functools
+import json
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append(path.join(path.dirname(path.abspath(__file__)), '..'))
+
+from tools import meross_simulator  # noqa
+
+
+print = functools.partial(print, flush=True)
+
+_PAIRING_TIMEOUT = 600
+_EVENT_TIMEOUT = 5
+
+
+def percentile(values, fraction):
+    """
+    Get a percentile of a list of values.
+
+    values -- the values
+    fraction -- the percentile, from 0 to 1
+    """
+    if len(values) == 0:
+        return None
+
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def run_fleet(args):
+    """
+    Start the adapter against a simulated fleet and measure it.
+
+    args -- parsed command line arguments
+    """
+    plugs = args.devices // 2
+    bulbs = args.devices * 3 // 10
+    openers = args.devices - plugs - bulbs
+
+    data_dir = tempfile.mkdtemp(prefix='meross-benchmark-')
+    fleet = meross_simulator.SimFleet(
+        plugs=plugs,
+        bulbs=bulbs,
+        openers=openers,
+        channels=args.channels,
+        latency=args.latency / 1000,
+        failure_rate=args.failure_rate,
+        config={
+            'username': 'sim',
+            'password': 'sim',
+            'metricsPort': 0,
+        },
+        data_dir=data_dir
+    )
+    meross_simulator.install(fleet)
+
+    from pkg.meross_adapter import MerossAdapter
+
+    # Devices whose probes fail are left out, so pairing is over once the
+    # first pass returns rather than once every device is there.
+    paired_event = threading.Event()
+    pair_account = MerossAdapter.pair_account
+
+    def timed_pair_account(self, account, timeout=None):
+        try:
+            pair_account(self, account, timeout)
+        finally:
+            paired_event.set()
+
+    MerossAdapter.pair_account = timed_pair_account
+
+    expected = fleet.expected_things()
+    start = time.perf_counter()
+    adapter = MerossAdapter(started=time.monotonic())
+
+    while len(adapter.devices) < expected and \
+            not paired_event.wait(0.01) and \
+            time.perf_counter() - start < _PAIRING_TIMEOUT:
+        pass
+
+    pairing = time.perf_counter() - start
+    paired = len(adapter.devices)
+
+    # Steady state: let the pollers settle into their schedule, then measure
+    # CPU time over a window of wall-clock time.
+    time.sleep(min(args.duration, 5))
+    calls = fleet.calls
+    notifications = fleet.gateway.notifications
+    cpu = time.process_time()
+    wall = time.perf_counter()
+    time.sleep(args.duration)
+    wall = time.perf_counter() - wall
+    cpu = time.process_time() - cpu
+    calls = fleet.calls - calls
+    notifications = fleet.gateway.notifications - notifications
+
+    # Event-to-notification latency, from a push event to the matching
+    # property change reaching the gateway.
+    plug_devices = [
+        d for d in fleet.devices
+        if isinstance(d, meross_simulator.GenericPlug)
+    ]
+    latencies = []
+    timeouts = 0
+    for _ in range(args.events if plug_devices else 0):
+        meross_dev = random.choice(plug_devices)
+        channel = random.randrange(max(len(meross_dev.get_channels()), 1))
+        if len(meross_dev.get_channels()) > 1:
+            _id = 'meross-{}-{}'.format(meross_dev.uuid, channel)
+        else:
+            _id = 'meross-{}'.format(meross_dev.uuid)
+
+        if _id not in adapter.devices:
+            continue
+
+        result, done = fleet.gateway.wait_for(_id, 'on')
+        meross_dev.toggle(channel, not meross_dev.get_status(channel))
+
+        if done.wait(_EVENT_TIMEOUT):
+            latencies.extend(result)
+        else:
+            timeouts += 1
+
+    report = {
+        'devices': args.devices,
+        'things': expected,
+        'paired': paired,
+        'pairing_seconds': round(pairing, 3),
+        'cpu_percent': round(100 * cpu / wall, 2),
+        'threads': threading.active_count(),
+        'max_rss_mb': round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+        ),
+        'calls_per_second': round(calls / wall, 1),
+        'notifications_per_second': round(notifications / wall, 1),
+        'event_p50_ms': None,
+        'event_p99_ms': None,
+        'event_timeouts': timeouts,
+    }
+
+    if len(latencies) > 0:
+        report['event_p50_ms'] = round(percentile(latencies, 0.5) * 1000, 3)
+        report['event_p99_ms'] = round(percentile(latencies, 0.99) * 1000, 3)
+
+    start = time.perf_counter()
+    report['clean_shutdown'] = adapter.shutdown()
+    report['shutdown_seconds'] = round(time.perf_counter() - start, 3)
+
+    shutil.rmtree(data_dir, ignore_errors=True)
+    return report
+
+
+_COLUMNS = [
+    ('devices', 'devices'),
+    ('things', 'things'),
+    ('paired', 'paired'),
+    ('pairing_seconds', 'pairing s'),
+    ('cpu_percent', 'cpu %'),
+    ('threads', 'threads'),
+    ('max_rss_mb', 'rss MB'),
+    ('calls_per_second', 'calls/s'),
+    ('notifications_per_second', 'notif/s'),
+    ('event_p50_ms', 'event p50 ms'),
+    ('event_p99_ms', 'event p99 ms'),
+    ('shutdown_seconds', 'shutdown s'),
+]
+
+
+def print_table(reports):
+    """
+    Print the reports as a table.
+
+    reports -- list of report dictionaries
+    """
+    widths = [
+        max([len(title)] + [len(str(r[key])) for r in reports])
+        for key, title in _COLUMNS
+    ]
+
+    print('  '.join(
+        title.rjust(width) for (_, title), width in zip(_COLUMNS, widths)
+    ))
+
+    for report in reports:
+        print('  '.join(
+            str(report[key]).rjust(width)
+            for (key, _), width in zip(_COLUMNS, widths)
+        ))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--devices', type=int, nargs='+',
+                        default=[10, 100, 1000, 10000],
+                        help='fleet sizes to run')
+    parser.add_argument('--channels', type=int, default=1,
+                        help='number of channels of each plug')
+    parser.add_argument('--latency', type=float, default=50,
+                        help='simulated command latency, in milliseconds')
+    parser.add_argument('--failure-rate', type=float, default=0,
+                        help='probability of a command failing')
+    parser.add_argument('--duration', type=float, default=10,
+                        help='steady-state measurement window, in seconds')
+    parser.add_argument('--events', type=int, default=200,
+                        help='number of push events to time')
+    parser.add_argument('--json', action='store_true',
+                        help='print the raw reports as JSON lines')
+    parser.add_argument('--child', action='store_true',
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        args.devices = args.devices[0]
+        print(json.dumps(run_fleet(args)))
+        sys.exit(0)
+
+    reports = []
+    for devices in args.devices:
+        output = subprocess.run(
+            [
+                sys.executable,
+                path.abspath(__file__),
+                '--child',
+                '--devices', str(devices),
+                '--channels', str(args.channels),
+                '--latency', str(args.latency),
+                '--failure-rate', str(args.failure_rate),
+                '--duration', str(args.duration),
+                '--events', str(args.events),
+            ],
+            stdout=subprocess.PIPE,
+            check=True
+        ).stdout.decode('utf-8')
+
+        report = json.loads(output.strip().splitlines()[-1])
+        reports.append(report)
+
+        if args.json:
+            print(json.dumps(report))
+
+    if not args.json:
+        print_table(reports)
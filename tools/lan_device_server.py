@@ -0,0 +1,177 @@
+"""Stand-in Meross device, serving the local HTTP interface for testing."""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from os import path
+import argparse
+import functools
+import json
+import random
+import sys
+import time
+
+sys.path.append(path.join(path.dirname(path.abspath(__file__)), '..'))
+
+from pkg.meross_transport import build_message, verify_message  # noqa
+
+
+print = functools.partial(print, flush=True)
+
+
+class FakeDevice:
+    """In-memory state of a simulated plug or bulb."""
+
+    def __init__(self, channels, host):
+        """
+        Initialize the object.
+
+        channels -- number of channels
+        host -- address reported as the device's local IP
+        """
+        self.host = host
+        self.onoff = [0] * channels
+        self.light = {
+            'rgb': 0xffffff,
+            'temperature': 100,
+            'luminance': 100,
+            'capacity': 6,
+        }
+
+    def handle(self, method, namespace, payload):
+        """
+        Handle a request.
+
+        method -- the method, e.g. 'GET' or 'SET'
+        namespace -- the namespace, e.g. 'Appliance.System.All'
+        payload -- the request payload
+
+        Returns the response payload, or None if the request is unsupported.
+        """
+        if namespace == 'Appliance.System.All' and method == 'GET':
+            return {
+                'all': {
+                    'system': {
+                        'firmware': {'innerIp': self.host},
+                        'online': {'status': 1},
+                    },
+                    'digest': {
+                        'togglex': [
+                            {'channel': c, 'onoff': v}
+                            for c, v in enumerate(self.onoff)
+                        ],
+                        'light': dict(self.light, channel=0),
+                    },
+                },
+            }
+
+        if namespace == 'Appliance.Control.ToggleX' and method == 'SET':
+            toggle = payload['togglex']
+            self.onoff[toggle['channel']] = toggle['onoff']
+            return {}
+
+        if namespace == 'Appliance.Control.Toggle' and method == 'SET':
+            self.onoff[0] = payload['toggle']['onoff']
+            return {}
+
+        if namespace == 'Appliance.Control.Electricity' and method == 'GET':
+            on = any(self.onoff)
+            return {
+                'electricity': {
+                    'channel': 0,
+                    'power': random.randint(40000, 60000) if on else 0,
+                    'voltage': random.randint(2280, 2320),
+                    'current': random.randint(180, 260) if on else 0,
+                },
+            }
+
+        if namespace == 'Appliance.Control.Light' and method == 'SET':
+            light = dict(payload['light'])
+            light.pop('channel', None)
+            light.pop('gradual', None)
+            self.light.update(light)
+            return {}
+
+        return None
+
+
+def make_handler(device, key, latency):
+    """
+    Build a request handler class for a device.
+
+    device -- the FakeDevice to serve
+    key -- the account key requests must be signed with
+    latency -- number of seconds to delay each response
+    """
+    class Handler(BaseHTTPRequestHandler):
+        """Request handler for the /config endpoint."""
+
+        def do_POST(self):
+            """Handle a POST request."""
+            if self.path != '/config':
+                self.send_error(404)
+                return
+
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length).decode('utf-8'))
+            header = request['header']
+
+            if latency > 0:
+                time.sleep(latency)
+
+            if not verify_message(request, key):
+                response = build_message('ERROR', header['namespace'],
+                                         {'error': {'code': 5001}}, key)
+            else:
+                payload = device.handle(header['method'],
+                                        header['namespace'],
+                                        request['payload'])
+                if payload is None:
+                    response = build_message('ERROR', header['namespace'],
+                                             {'error': {'code': 5000}}, key)
+                else:
+                    response = build_message(
+                        '{}ACK'.format(header['method']),
+                        header['namespace'],
+                        payload,
+                        key
+                    )
+
+            data = json.dumps(response).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, fmt, *args):
+            """Silence the default per-request logging."""
+            pass
+
+    return Handler
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--key', default='')
+    parser.add_argument('--channels', type=int, default=1)
+    parser.add_argument('--latency', type=float, default=0,
+                        help='response delay, in milliseconds')
+    args = parser.parse_args()
+
+    address = '{}:{}'.format(args.host, args.port)
+    server = ThreadingHTTPServer(
+        (args.host, args.port),
+        make_handler(
+            FakeDevice(args.channels, address),
+            args.key,
+            args.latency / 1000
+        )
+    )
+
+    print('Serving a stand-in Meross device on {}'.format(address))
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,956 @@
+"""
+Simulated Meross fleet and gateway, for running the adapter offline.
+
+install() registers stand-in gateway_addon and meross_iot modules, so that
+pkg.meross_adapter can be imported and driven without a gateway, a Meross
+account or a network.
+"""
+
+from enum import Enum
+import random
+import sys
+import threading
+import time
+import types
+
+
+class MerossEventType(Enum):
+    """Event types, mirroring meross_iot.meross_event.MerossEventType."""
+
+    CLIENT_CONNECTION = 10
+    DEVICE_ONLINE_STATUS = 100
+    DEVICE_BIND = 200
+    DEVICE_UNBIND = 201
+    DEVICE_SWITCH_STATUS = 1000
+    DEVICE_BULB_SWITCH_STATE = 2000
+    DEVICE_BULB_STATE = 2001
+    GARAGE_DOOR_STATUS = 3000
+
+
+class MerossEvent:
+    """Base event, mirroring meross_iot.meross_event.MerossEvent."""
+
+    def __init__(self, event_type, device, **attributes):
+        """
+        Initialize the object.
+
+        event_type -- the MerossEventType
+        device -- the device the event is about
+        attributes -- event-specific attributes
+        """
+        self.event_type = event_type
+        self.device = device
+        self.generated_by_myself = False
+        self.__dict__.update(attributes)
+
+
+class SimCommandError(Exception):
+    """Simulated cloud failure."""
+
+    pass
+
+
+class SimFleet:
+    """Configuration and shared state of a simulated fleet."""
+
+    def __init__(self, plugs=0, bulbs=0, openers=0, channels=1, latency=0,
+                 failure_rate=0, config=None, data_dir='/tmp'):
+        """
+        Initialize the object.
+
+        plugs -- number of plugs
+        bulbs -- number of bulbs
+        openers -- number of garage door openers
+        channels -- number of channels of each plug
+        latency -- number of seconds each command takes
+        failure_rate -- probability of a command failing
+        config -- adapter config, as stored in the gateway database
+        data_dir -- gateway data directory
+        """
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.config = config or {'username': 'sim', 'password': 'sim'}
+        self.data_dir = data_dir
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.handlers = []
+        self.gateway = SimGateway()
+        self.devices = []
+
+        for i in range(plugs):
+            self.devices.append(GenericPlug(self, i, channels))
+
+        for i in range(bulbs):
+            self.devices.append(GenericBulb(self, i))
+
+        for i in range(openers):
+            self.devices.append(GenericGarageDoorOpener(self, i))
+
+    def command(self):
+        """Simulate the cost and failures of one cloud round-trip."""
+        with self.lock:
+            self.calls += 1
+
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+        if self.failure_rate > 0 and random.random() < self.failure_rate:
+            raise SimCommandError('Simulated command failure')
+
+    def fire(self, event):
+        """
+        Deliver a push event to the registered handlers.
+
+        event -- the event to deliver
+        """
+        for handler in list(self.handlers):
+            handler(event)
+
+    def expected_things(self):
+        """Get the number of Things the adapter should create."""
+        return sum(max(len(d.get_channels()), 1) for d in self.devices)
+
+
+class SimDevice:
+    """Base of the simulated meross device objects."""
+
+    prefix = 'dev'
+    abilities = {}
+
+    def __init__(self, fleet, index, channels=1):
+        """
+        Initialize the object.
+
+        fleet -- the SimFleet this device belongs to
+        index -- index of the device within its kind
+        channels -- number of channels
+        """
+        self.fleet = fleet
+        self.uuid = '{}{:06d}'.format(self.prefix, index)
+        self.name = '{} {}'.format(self.prefix, index)
+        self.type = 'sim-{}'.format(self.prefix)
+        self.online = True
+        self._channels = [{}] * channels if channels > 1 else []
+        self._abilities = None
+
+    def execute_command(self, command, namespace, payload, callback=None,
+                        timeout=10.0, online_check=True):
+        """
+        Execute a command, like AbstractMerossDevice.execute_command().
+
+        command -- the method, e.g. 'GET' or 'SET'
+        namespace -- the namespace, e.g. 'Appliance.System.All'
+        payload -- the payload, as a dictionary
+        """
+        self.fleet.command()
+
+        if namespace == 'Appliance.System.Ability':
+            return {'ability': dict(self.abilities)}
+
+        if namespace == 'Appliance.System.All':
+            return {
+                'all': {
+                    'system': {
+                        'firmware': {'innerIp': '127.0.0.1:0'},
+                        'online': {'status': 1 if self.online else 2},
+                    },
+                },
+            }
+
+        return self.handle(command, namespace, payload)
+
+    def handle(self, command, namespace, payload):
+        """
+        Handle a device-specific command.
+
+        command -- the method, e.g. 'GET' or 'SET'
+        namespace -- the namespace
+        payload -- the payload, as a dictionary
+        """
+        return {}
+
+    def get_abilities(self):
+        """Get the abilities, fetching them once."""
+        if self._abilities is None:
+            self._abilities = self.execute_command(
+                'GET', 'Appliance.System.Ability', {})['ability']
+
+        return self._abilities
+
+    def get_sys_data(self):
+        """Get the system data."""
+        return self.execute_command('GET', 'Appliance.System.All', {},
+                                    online_check=False)
+
+    def get_channels(self):
+        """Get the channels."""
+        return self._channels
+
+    def supports_electricity_reading(self):
+        """Determine whether the device reads electricity."""
+        return 'Appliance.Control.Electricity' in self.get_abilities()
+
+    def supports_light_control(self):
+        """Determine whether the device controls a light."""
+        return 'Appliance.Control.Light' in self.get_abilities()
+
+    def set_online(self, online):
+        """
+        Change the online status and push it.
+
+        online -- whether or not the device is online
+        """
+        self.online = online
+        self.fleet.fire(MerossEvent(
+            MerossEventType.DEVICE_ONLINE_STATUS,
+            self,
+            status='online' if online else 'offline'
+        ))
+
+
+class GenericPlug(SimDevice):
+    """Simulated plug, mimicking meross_iot's GenericPlug."""
+
+    prefix = 'plug'
+    abilities = {
+        'Appliance.Control.ToggleX': {},
+        'Appliance.Control.Electricity': {},
+    }
+
+    def __init__(self, fleet, index, channels=1):
+        """
+        Initialize the object.
+
+        fleet -- the SimFleet this device belongs to
+        index -- index of the device within its kind
+        channels -- number of channels
+        """
+        SimDevice.__init__(self, fleet, index, channels)
+        self._state = {c: False for c in range(max(channels, 1))}
+
+    def handle(self, command, namespace, payload):
+        """
+        Handle a device-specific command.
+
+        command -- the method, e.g. 'GET' or 'SET'
+        namespace -- the namespace
+        payload -- the payload, as a dictionary
+        """
+        if namespace == 'Appliance.Control.Electricity':
+            on = any(self._state.values())
+            return {
+                'electricity': {
+                    'channel': 0,
+                    'power': random.randint(40000, 60000) if on else 0,
+                    'voltage': random.randint(2280, 2320),
+                    'current': random.randint(180, 260) if on else 0,
+                },
+            }
+
+        if namespace == 'Appliance.Control.ToggleX':
+            channel = payload['togglex']['channel']
+            self.toggle(channel, payload['togglex']['onoff'] == 1)
+
+        return {}
+
+    def toggle(self, channel, on):
+        """
+        Change the state of a channel and push it.
+
+        channel -- the channel index
+        on -- the new state
+        """
+        self._state[channel] = on
+        self.fleet.fire(MerossEvent(
+            MerossEventType.DEVICE_SWITCH_STATUS,
+            self,
+            channel_id=channel,
+            switch_state=on
+        ))
+
+    def get_status(self, channel=0, force_status_refresh=False):
+        """
+        Get the on/off state of a channel.
+
+        channel -- the channel index
+        force_status_refresh -- whether to fetch the state again
+        """
+        if force_status_refresh:
+            self.get_sys_data()
+
+        return self._state.get(channel)
+
+    def get_electricity(self):
+        """Get the electricity reading."""
+        return self.execute_command(
+            'GET', 'Appliance.Control.Electricity', {})['electricity']
+
+    def turn_on(self, channel=0, callback=None):
+        """
+        Turn a channel on.
+
+        channel -- the channel index
+        """
+        return self.execute_command(
+            'SET', 'Appliance.Control.ToggleX',
+            {'togglex': {'onoff': 1, 'channel': channel}})
+
+    def turn_off(self, channel=0, callback=None):
+        """
+        Turn a channel off.
+
+        channel -- the channel index
+        """
+        return self.execute_command(
+            'SET', 'Appliance.Control.ToggleX',
+            {'togglex': {'onoff': 0, 'channel': channel}})
+
+
+class GenericBulb(SimDevice):
+    """Simulated bulb, mimicking meross_iot's GenericBulb."""
+
+    prefix = 'bulb'
+    abilities = {
+        'Appliance.Control.ToggleX': {},
+        'Appliance.Control.Light': {'capacity': 7},
+    }
+
+    def __init__(self, fleet, index, channels=1):
+        """
+        Initialize the object.
+
+        fleet -- the SimFleet this device belongs to
+        index -- index of the device within its kind
+        channels -- number of channels
+        """
+        SimDevice.__init__(self, fleet, index, channels)
+        self._state = {
+            c: {
+                'onoff': False,
+                'rgb': 0xffffff,
+                'temperature': 50,
+                'luminance': 100,
+                'capacity': 6,
+            }
+            for c in range(max(channels, 1))
+        }
+
+    def handle(self, command, namespace, payload):
+        """
+        Handle a device-specific command.
+
+        command -- the method, e.g. 'GET' or 'SET'
+        namespace -- the namespace
+        payload -- the payload, as a dictionary
+        """
+        if namespace == 'Appliance.Control.ToggleX':
+            channel = payload['togglex']['channel']
+            self._state[channel]['onoff'] = payload['togglex']['onoff'] == 1
+            self.fleet.fire(MerossEvent(
+                MerossEventType.DEVICE_BULB_SWITCH_STATE,
+                self,
+                channel=channel,
+                is_on=self._state[channel]['onoff']
+            ))
+        elif namespace == 'Appliance.Control.Light':
+            light = dict(payload['light'])
+            channel = light.pop('channel')
+            light.pop('gradual', None)
+            self._state[channel].update(light)
+            self.fleet.fire(MerossEvent(
+                MerossEventType.DEVICE_BULB_STATE,
+                self,
+                channel=channel,
+                light_state=dict(self._state[channel])
+            ))
+
+        return {}
+
+    def supports_mode(self, mode):
+        """
+        Determine whether the bulb supports a light mode.
+
+        mode -- the mode bit mask
+        """
+        capacity = self.get_abilities()['Appliance.Control.Light']['capacity']
+        return capacity & mode == mode
+
+    def is_rgb(self):
+        """Determine whether the bulb supports colors."""
+        return self.supports_mode(1)
+
+    def is_light_temperature(self):
+        """Determine whether the bulb supports color temperatures."""
+        return self.supports_mode(2)
+
+    def supports_luminance(self):
+        """Determine whether the bulb supports brightness."""
+        return self.supports_mode(4)
+
+    def get_status(self, channel=0, force_status_refresh=False):
+        """
+        Get the state of a channel.
+
+        channel -- the channel index
+        force_status_refresh -- whether to fetch the state again
+        """
+        if force_status_refresh:
+            self.get_sys_data()
+
+        return dict(self._state[channel])
+
+    def get_light_color(self, channel=0):
+        """
+        Get the light state of a channel.
+
+        channel -- the channel index
+        """
+        return self.get_status(channel=channel)
+
+    def turn_on(self, channel=0):
+        """
+        Turn a channel on.
+
+        channel -- the channel index
+        """
+        return self.execute_command(
+            'SET', 'Appliance.Control.ToggleX',
+            {'togglex': {'onoff': 1, 'channel': channel}})
+
+    def turn_off(self, channel=0):
+        """
+        Turn a channel off.
+
+        channel -- the channel index
+        """
+        return self.execute_command(
+            'SET', 'Appliance.Control.ToggleX',
+            {'togglex': {'onoff': 0, 'channel': channel}})
+
+    def set_light_color(self, channel=0, rgb=None, luminance=-1,
+                        temperature=-1, capacity=None):
+        """
+        Set the light state of a channel.
+
+        channel -- the channel index
+        rgb -- color, as an integer
+        luminance -- brightness, from 0 to 100
+        temperature -- color temperature, from 0 to 100
+        capacity -- ignored, kept for compatibility
+        """
+        light = {'channel': channel, 'gradual': 0}
+        mode = 0
+        if rgb is not None:
+            light['rgb'] = rgb
+            mode |= 1
+
+        if temperature != -1:
+            light['temperature'] = temperature
+            mode |= 2
+
+        if luminance != -1:
+            light['luminance'] = luminance
+            mode |= 4
+
+        light['capacity'] = mode
+        self.execute_command('SET', 'Appliance.Control.Light',
+                             {'light': light})
+
+
+class GenericGarageDoorOpener(SimDevice):
+    """Simulated opener, mimicking meross_iot's GenericGarageDoorOpener."""
+
+    prefix = 'door'
+    abilities = {
+        'Appliance.GarageDoor.State': {},
+    }
+
+    def __init__(self, fleet, index, channels=1):
+        """
+        Initialize the object.
+
+        fleet -- the SimFleet this device belongs to
+        index -- index of the device within its kind
+        channels -- number of channels
+        """
+        SimDevice.__init__(self, fleet, index, channels)
+        self._door_state = {0: False}
+        self.travel_time = 0
+
+    def handle(self, command, namespace, payload):
+        """
+        Handle a device-specific command.
+
+        command -- the method, e.g. 'GET' or 'SET'
+        namespace -- the namespace
+        payload -- the payload, as a dictionary
+        """
+        if namespace == 'Appliance.GarageDoor.State':
+            state = payload['state']
+
+            def move():
+                time.sleep(self.travel_time)
+                self._door_state[state['channel']] = state['open'] == 1
+                self.fleet.fire(MerossEvent(
+                    MerossEventType.GARAGE_DOOR_STATUS,
+                    self,
+                    channel=state['channel'],
+                    door_state='open' if state['open'] == 1 else 'closed'
+                ))
+
+            t = threading.Thread(target=move)
+            t.daemon = True
+            t.start()
+
+        return {}
+
+    def get_status(self, force_status_refresh=False):
+        """
+        Get the door states, by channel.
+
+        force_status_refresh -- whether to fetch the state again
+        """
+        if force_status_refresh:
+            self.get_sys_data()
+
+        return dict(self._door_state)
+
+    def open_door(self, channel=0, callback=None, ensure_opened=True):
+        """
+        Open a door.
+
+        channel -- the channel index
+        """
+        self.execute_command(
+            'SET', 'Appliance.GarageDoor.State',
+            {'state': {'channel': channel, 'open': 1, 'uuid': self.uuid}})
+
+    def close_door(self, channel=0, callback=None, ensure_closed=True):
+        """
+        Close a door.
+
+        channel -- the channel index
+        """
+        self.execute_command(
+            'SET', 'Appliance.GarageDoor.State',
+            {'state': {'channel': channel, 'open': 0, 'uuid': self.uuid}})
+
+
+class SimCredentials:
+    """Stand-in for meross_iot's MerossCloudCreds."""
+
+    key = 'sim-key'
+    token = 'sim-token'
+
+
+class MerossHttpClient:
+    """Stand-in for meross_iot's MerossHttpClient."""
+
+    @classmethod
+    def login(cls, email, password):
+        """
+        Log in.
+
+        email -- account email
+        password -- account password
+        """
+        return SimCredentials()
+
+
+def make_manager_class(fleet):
+    """
+    Build a MerossManager stand-in serving a fleet.
+
+    fleet -- the SimFleet to serve
+    """
+    class MerossManager:
+        """Stand-in for meross_iot's MerossManager."""
+
+        def __init__(self, cloud_credentials, discovery_interval,
+                     auto_reconnect):
+            """
+            Initialize the object.
+
+            Like the current meross_iot releases, this takes no
+            logout_on_stop argument, so only from_email_and_password() is
+            portable.
+
+            cloud_credentials -- credentials returned from login
+            discovery_interval -- number of seconds between discoveries
+            auto_reconnect -- whether to reconnect after losing the broker
+            """
+            self._cloud_creds = cloud_credentials
+            self.devices = {d.uuid: d for d in fleet.devices}
+
+        @classmethod
+        def from_email_and_password(cls, meross_email, meross_password,
+                                    discovery_interval=30.0,
+                                    auto_reconnect=True):
+            """
+            Log in and build a manager.
+
+            meross_email -- account email
+            meross_password -- account password
+            discovery_interval -- number of seconds between discoveries
+            auto_reconnect -- whether to reconnect after losing the broker
+            """
+            return cls(
+                cloud_credentials=MerossHttpClient.login(
+                    email=meross_email,
+                    password=meross_password
+                ),
+                discovery_interval=discovery_interval,
+                auto_reconnect=auto_reconnect
+            )
+
+        def register_event_handler(self, callback):
+            """
+            Register an event handler.
+
+            callback -- the handler
+            """
+            fleet.handlers.append(callback)
+
+        def unregister_event_handler(self, callback):
+            """
+            Unregister an event handler.
+
+            callback -- the handler
+            """
+            if callback in fleet.handlers:
+                fleet.handlers.remove(callback)
+
+        def start(self, wait_for_first_discovery=True):
+            """Connect to the simulated cloud."""
+            fleet.command()
+
+        def stop(self):
+            """Disconnect from the simulated cloud."""
+            pass
+
+        def get_devices_by_kind(self, clazz):
+            """
+            Get the devices of one kind.
+
+            clazz -- the device class
+            """
+            return [d for d in self.devices.values() if isinstance(d, clazz)]
+
+        def get_device_by_uuid(self, uuid):
+            """
+            Get a device by UUID.
+
+            uuid -- UUID of the device
+            """
+            return self.devices.get(uuid)
+
+    return MerossManager
+
+
+class SimGateway:
+    """Records the messages the adapter sends to the gateway."""
+
+    def __init__(self):
+        """Initialize the object."""
+        self.lock = threading.Lock()
+        self.running = True
+        self.notifications = 0
+        self.waiters = {}
+
+    def property_changed(self, device, prop):
+        """
+        Record a property change notification.
+
+        device -- the device the property belongs to
+        prop -- the property
+        """
+        with self.lock:
+            self.notifications += 1
+            waiter = self.waiters.pop((device.id, prop.name), None)
+
+        if waiter is not None:
+            waiter[1].append(time.perf_counter() - waiter[0])
+            waiter[2].set()
+
+    def wait_for(self, device_id, name):
+        """
+        Register interest in the next notification of a property.
+
+        device_id -- ID of the device
+        name -- name of the property
+
+        Returns a (latencies, event) pair; the latency is appended to the
+        list and the event set once the notification arrives.
+        """
+        latencies = []
+        event = threading.Event()
+
+        with self.lock:
+            self.waiters[(device_id, name)] = \
+                (time.perf_counter(), latencies, event)
+
+        return latencies, event
+
+
+def make_gateway_addon(fleet):
+    """
+    Build a gateway_addon stand-in module.
+
+    fleet -- the SimFleet whose gateway records the messages
+    """
+    gateway = fleet.gateway
+    module = types.ModuleType('gateway_addon')
+
+    class Adapter:
+        """Stand-in for gateway_addon's Adapter."""
+
+        def __init__(self, _id, package_name, verbose=False):
+            """
+            Initialize the object.
+
+            _id -- ID of the adapter
+            package_name -- name of the add-on package
+            verbose -- whether or not to enable verbose logging
+            """
+            self.id = _id
+            self.package_name = package_name
+            self.verbose = verbose
+            self.devices = {}
+            self.user_profile = {'dataDir': fleet.data_dir}
+
+        def handle_device_added(self, device):
+            """
+            Record a new device.
+
+            device -- the device that was added
+            """
+            self.devices[device.id] = device
+
+        def handle_device_removed(self, device):
+            """
+            Record a removed device.
+
+            device -- the device that was removed
+            """
+            self.devices.pop(device.id, None)
+
+        def proxy_running(self):
+            """Determine whether the gateway connection is up."""
+            return gateway.running
+
+        def close_proxy(self):
+            """Close the gateway connection."""
+            gateway.running = False
+
+    class Device:
+        """Stand-in for gateway_addon's Device."""
+
+        def __init__(self, adapter, _id):
+            """
+            Initialize the object.
+
+            adapter -- the Adapter managing this device
+            _id -- ID of this device
+            """
+            self.adapter = adapter
+            self.id = _id
+            self.name = ''
+            self.description = ''
+            self._type = []
+            self.properties = {}
+            self.actions = {}
+            self.events = {}
+
+        def add_action(self, name, metadata):
+            """
+            Add an action.
+
+            name -- name of the action
+            metadata -- action metadata
+            """
+            self.actions[name] = metadata
+
+        def add_event(self, name, metadata):
+            """
+            Add an event.
+
+            name -- name of the event
+            metadata -- event metadata
+            """
+            self.events[name] = metadata
+
+        def notify_property_changed(self, prop):
+            """
+            Notify the gateway of a property change.
+
+            prop -- the property that changed
+            """
+            gateway.property_changed(self, prop)
+
+        def connected_notify(self, connected):
+            """
+            Notify the gateway of a connectivity change.
+
+            connected -- whether or not the device is connected
+            """
+            pass
+
+        def action_notify(self, action):
+            """
+            Notify the gateway of an action status change.
+
+            action -- the action
+            """
+            pass
+
+        def event_notify(self, event):
+            """
+            Notify the gateway of an event.
+
+            event -- the event
+            """
+            pass
+
+    class Property:
+        """Stand-in for gateway_addon's Property."""
+
+        def __init__(self, device, name, description):
+            """
+            Initialize the object.
+
+            device -- the Device this property belongs to
+            name -- name of the property
+            description -- description of the property
+            """
+            self.device = device
+            self.name = name
+            self.description = description
+            self.value = None
+
+        def set_cached_value(self, value):
+            """
+            Set the cached value.
+
+            value -- the value
+            """
+            if self.description.get('type') == 'boolean':
+                value = bool(value)
+
+            self.value = value
+            return self.value
+
+        def get_value(self):
+            """Get the cached value."""
+            return self.value
+
+    class Action:
+        """Stand-in for gateway_addon's Action."""
+
+        def __init__(self, _id, device, name, _input):
+            """
+            Initialize the object.
+
+            _id -- ID of the action
+            device -- the Device the action belongs to
+            name -- name of the action
+            _input -- input of the action
+            """
+            self.id = _id
+            self.device = device
+            self.name = name
+            self.input = _input
+            self.status = 'created'
+
+        def start(self):
+            """Mark the action as started."""
+            self.status = 'pending'
+            self.device.action_notify(self)
+
+        def finish(self):
+            """Mark the action as completed."""
+            self.status = 'completed'
+            self.device.action_notify(self)
+
+    class Event:
+        """Stand-in for gateway_addon's Event."""
+
+        def __init__(self, device, name, data=None):
+            """
+            Initialize the object.
+
+            device -- the Device the event belongs to
+            name -- name of the event
+            data -- event data
+            """
+            self.device = device
+            self.name = name
+            self.data = data
+
+    class Database:
+        """Stand-in for gateway_addon's Database."""
+
+        def __init__(self, package_name, path=None):
+            """
+            Initialize the object.
+
+            package_name -- name of the add-on package
+            path -- ignored
+            """
+            self.package_name = package_name
+
+        def open(self):
+            """Open the database."""
+            return True
+
+        def load_config(self):
+            """Load the add-on config."""
+            return dict(fleet.config)
+
+        def save_config(self, config):
+            """
+            Save the add-on config.
+
+            config -- the config
+            """
+            fleet.config = dict(config)
+
+        def close(self):
+            """Close the database."""
+            pass
+
+    module.Adapter = Adapter
+    module.Device = Device
+    module.Property = Property
+    module.Action = Action
+    module.Event = Event
+    module.Database = Database
+    return module
+
+
+def install(fleet):
+    """
+    Register the stand-in modules for a fleet.
+
+    This must run before pkg.meross_adapter is imported.
+
+    fleet -- the SimFleet to serve
+    """
+    def module(name, **attributes):
+        m = types.ModuleType(name)
+        m.__dict__.update(attributes)
+        sys.modules[name] = m
+        return m
+
+    sys.modules['gateway_addon'] = make_gateway_addon(fleet)
+
+    module('meross_iot')
+    module('meross_iot.cloud')
+    module('meross_iot.cloud.devices')
+    module('meross_iot.api', MerossHttpClient=MerossHttpClient)
+    module('meross_iot.manager', MerossManager=make_manager_class(fleet))
+    module('meross_iot.meross_event', MerossEventType=MerossEventType,
+           MerossEvent=MerossEvent)
+    module('meross_iot.cloud.devices.light_bulbs', GenericBulb=GenericBulb)
+    module('meross_iot.cloud.devices.power_plugs', GenericPlug=GenericPlug)
+    module('meross_iot.cloud.devices.door_openers',
+           GenericGarageDoorOpener=GenericGarageDoorOpener)